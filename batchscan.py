@@ -0,0 +1,76 @@
+#batchscan.py
+'''
+Run the moving average crossover grid search over a whole universe of tickers.
+
+All tickers are aligned into one dates x tickers price array and every
+(short, long) pair is evaluated for every ticker at once (see
+macross.panel_grid_search), so a scan over hundreds of tickers costs about
+as much as a few single-ticker runs of optgpt.py.
+
+Put one ticker per line in tickers.txt, or edit the default list in main().
+'''
+import csv
+import os
+from datetime import datetime
+
+import numpy as np
+
+import macross
+import pricestore
+
+
+def batch_backtest(tickers, start_date, end_date, short_ma_values, long_ma_values, sell_conditions=True):
+    prices = pricestore.load_close_matrix(tickers, start_date, end_date, fill=False)
+    if prices.empty:
+        # None of the tickers has any prices in the range
+        return [(ticker, None, None, np.nan, 0) for ticker in prices.columns]
+    # Bars each ticker actually traded, counted before the gaps are forward filled
+    bars = prices.count()
+    prices = prices.ffill()
+
+    # Same 5/15/30 day sell rule as optgpt.apply_sell_conditions
+    def sell_filter(positions):
+        return macross.holding_period_filter(prices.index, positions)
+
+    pairs, performance = macross.panel_grid_search(prices.to_numpy(), short_ma_values, long_ma_values, 4,
+                                                   sell_filter if sell_conditions else None)
+
+    results = []
+    for column, ticker in enumerate(prices.columns):
+        ticker_performance = performance[:, column]
+        if np.isnan(ticker_performance).all():
+            results.append((ticker, None, None, np.nan, int(bars[ticker])))
+            continue
+        best = int(np.nanargmax(ticker_performance))
+        results.append((ticker, pairs[best][0], pairs[best][1], float(ticker_performance[best]), int(bars[ticker])))
+
+    return results
+
+
+def main():
+    if os.path.exists('tickers.txt'):
+        with open('tickers.txt') as file:
+            tickers = [line.strip() for line in file if line.strip()]
+    else:
+        tickers = ["SPY", "QQQ", "IWM", "DIA"]
+    start_date = "2000-01-01"
+    end_date = "2023-03-31"
+
+    short_ma_values = range(3, 50)  # Define a range of short MA values for buying
+    long_ma_values = range(4, 51)  # Define a range of long MA values for buying
+
+    results = batch_backtest(tickers, start_date, end_date, short_ma_values, long_ma_values)
+
+    current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    file_name = f'batch_scan_results_{current_time}.csv'
+
+    with open(file_name, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Ticker', 'Short MA', 'Long MA', 'Overall Performance', 'Bars'])
+        for row in results:
+            writer.writerow(row)
+
+    print(f"Wrote results for {len(results)} tickers to {file_name}")
+
+if __name__ == "__main__":
+    main()
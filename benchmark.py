@@ -0,0 +1,155 @@
+#benchmark.py
+'''
+Reproducible benchmarks for the backtesting hot paths.
+
+Runs moving_average_cross_strategy(), apply_sell_conditions(),
+calculate_performance(), grid_search() and walk_forward_optimization() on
+synthetic, seeded price series, so results are comparable between runs and
+need neither yfinance nor network access.
+
+Each run appends wall time (best of --repeat), peak traced memory and
+evaluations per second for every case to a JSON history file. With a stored
+baseline (--save-baseline writes one) any case slower than the baseline by
+more than --tolerance is flagged and the script exits with status 1.
+
+    python benchmark.py --bars 1000 100000 --grid 3:21 22:51
+'''
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import macross
+import optgpt
+import walkforward
+
+
+def synthetic_prices(bars, seed=0):
+    # Geometric random walk on business days, roughly SPY-like drift and volatility
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('1990-01-01', periods=bars, name='Date')
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, bars)))
+    return pd.DataFrame({'Close': close}, index=index)
+
+
+def measure(function, repeat):
+    # Best wall time over repeat runs, and the peak traced memory of one run
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def cases(data, short_ma_values, long_ma_values, num_windows, workers):
+    # name -> (function, evaluations per call)
+    signals = optgpt.moving_average_cross_strategy(data, short_ma_values[0], long_ma_values[-1])
+    pairs = len(macross.valid_pairs(short_ma_values, long_ma_values))
+    windows = max(num_windows - 1, 1)
+    return {
+        'moving_average_cross_strategy': (lambda: optgpt.moving_average_cross_strategy(data, short_ma_values[0], long_ma_values[-1]), 1),
+        'apply_sell_conditions': (lambda: optgpt.apply_sell_conditions(data, signals.copy()), 1),
+        'calculate_performance': (lambda: optgpt.calculate_performance(data, signals, 4), 1),
+        'grid_search': (lambda: optgpt.grid_search(data, short_ma_values, long_ma_values), pairs),
+        'walk_forward_optimization': (lambda: walkforward.walk_forward_optimization(data, short_ma_values, long_ma_values, num_windows, workers=workers), pairs * windows),
+    }
+
+
+def run(bars_list, short_ma_values, long_ma_values, num_windows=8, workers=None, repeat=3, seed=0, only=None):
+    results = {}
+    for bars in bars_list:
+        data = synthetic_prices(bars, seed)
+        for name, (function, evaluations) in cases(data, short_ma_values, long_ma_values, num_windows, workers).items():
+            if only and name not in only:
+                continue
+            wall_time, peak = measure(function, repeat)
+            key = f'{name}[bars={bars}]'
+            results[key] = {'wall_time': wall_time, 'peak_memory': peak, 'evaluations_per_second': evaluations / wall_time}
+            print(f"{key:55s} {wall_time * 1e3:10.2f} ms {peak / 1e6:9.1f} MB {evaluations / wall_time:12,.0f} eval/s")
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    flagged = []
+    for key, result in results.items():
+        if key in baseline and result['wall_time'] > baseline[key]['wall_time'] * (1 + tolerance):
+            flagged.append((key, baseline[key]['wall_time'], result['wall_time']))
+    return flagged
+
+
+def _window_range(text):
+    start, stop = text.split(':')
+    return range(int(start), int(stop))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backtesting hot paths on synthetic prices.")
+    parser.add_argument('--bars', type=int, nargs='+', default=[1_000, 10_000], help="price series lengths (1k to 1M)")
+    parser.add_argument('--grid', type=_window_range, nargs=2, default=[range(3, 21), range(22, 51)], metavar='START:STOP',
+                        help="short and long MA ranges")
+    parser.add_argument('--windows', type=int, default=8, help="walk-forward windows")
+    parser.add_argument('--workers', type=int, default=None, help="walk-forward worker processes")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', help="run only these cases")
+    parser.add_argument('--history', default='benchmark_history.json')
+    parser.add_argument('--baseline', default='benchmark_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = run(args.bars, args.grid[0], args.grid[1], args.windows, args.workers, args.repeat, args.seed, args.only)
+
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'grid': [[args.grid[0].start, args.grid[0].stop], [args.grid[1].start, args.grid[1].stop]],
+        'results': results,
+    }
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as file:
+            history = json.load(file)
+    history.append(record)
+    with open(args.history, 'w') as file:
+        json.dump(history, file, indent=1)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump({'grid': record['grid'], 'results': results}, file, indent=1)
+        print("Saved baseline to", args.baseline)
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline['grid'] != record['grid']:
+            print("Baseline was recorded with a different grid; not comparing")
+            return
+        flagged = regressions(results, baseline['results'], args.tolerance)
+        for key, before, after in flagged:
+            print(f"REGRESSION {key}: {before * 1e3:.2f} ms -> {after * 1e3:.2f} ms")
+        if flagged:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,11 @@
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import quote
+
 import requests
+from requests.adapters import HTTPAdapter
 
 # Specify the URL of the SharePoint 2013 site
 site_url = "https://your-site-url.com"
@@ -7,27 +14,224 @@ site_url = "https://your-site-url.com"
 username = "your_username"
 password = "your_password"
 
-# Authenticate to the SharePoint 2013 site
-auth = requests.auth.HTTPBasicAuth(username, password)
+# Specify the local folder the export is written to
+export_folder = "site_export"
+
+# Number of requests in flight at the same time, and items requested per page
+max_workers = 8
+page_size = 1000
+
+json_headers = {"accept": "application/json;odata=verbose"}
+
+
+class SiteExport:
+    # Crawls webs, lists, list items and files through the REST API. Every page of results is a
+    # separate task in a bounded thread pool sharing one pooled session, and results are streamed
+    # to newline-delimited JSON (and files) under export_folder as they arrive:
+    #
+    #   webs.jsonl, lists.jsonl       one line per web / list
+    #   items/<list id>.jsonl         one line per item, appended by every (incremental) run
+    #   files/<server relative url>   document contents
+    #   state.json                    last Modified timestamp exported per list
+    #
+    # A list's items are first written to items/<list id>.part.jsonl and only appended to the
+    # list's file, and its state updated, once every page has been read and every document of
+    # the list has been downloaded. A rerun (or a resumed crash) asks only for items modified after
+    # the saved timestamp; a list with a failed page or download keeps its old checkpoint.
+    def __init__(self, site_url, username, password, export_folder, workers=max_workers, page_size=page_size):
+        self.site_url = site_url.rstrip("/")
+        self.export_folder = export_folder
+        self.workers = workers
+        self.page_size = page_size
+
+        self.session = requests.Session()
+        self.session.auth = requests.auth.HTTPBasicAuth(username, password)
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=3)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._state_file = os.path.join(export_folder, "state.json")
+        self.state = {}
+        if os.path.exists(self._state_file):
+            with open(self._state_file) as file:
+                self.state = json.load(file)
+        self.stats = {"webs": 0, "lists": 0, "items": 0, "files": 0}
+        # list id -> outstanding pages and downloads, newest Modified seen, and whether one failed
+        self._progress = {}
+        self.failures = []
+
+    def _get(self, url, stream=False):
+        response = self.session.get(url, headers=json_headers, stream=stream)
+        response.raise_for_status()
+        return response
+
+    def _append(self, name, record):
+        with self._lock:
+            with open(os.path.join(self.export_folder, name), "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _started(self, list_id, n=1):
+        with self._lock:
+            self._progress[list_id]["pending"] += n
+
+    def _finished(self, list_id, failed=False):
+        # Publish the list's items and checkpoint it once nothing of it is outstanding
+        with self._lock:
+            progress = self._progress[list_id]
+            progress["pending"] -= 1
+            progress["failed"] |= failed
+            if progress["pending"] or progress["failed"]:
+                return
+            latest = progress["latest"]
+
+        part = os.path.join(self.export_folder, "items", list_id + ".part.jsonl")
+        with open(part, encoding="utf-8") as source, open(os.path.join(self.export_folder, "items", list_id + ".jsonl"), "a", encoding="utf-8") as target:
+            for line in source:
+                target.write(line)
+        os.remove(part)
+        if latest:
+            self._save_state(list_id, latest)
+
+    def _save_state(self, list_id, modified):
+        with self._lock:
+            self.state[list_id] = modified
+            with open(self._state_file + ".tmp", "w") as file:
+                json.dump(self.state, file)
+            os.replace(self._state_file + ".tmp", self._state_file)
+
+    # Each task below returns the follow-up tasks it discovered as (function, args) tuples
+
+    def web(self, web_url):
+        record = self._get(web_url + "/_api/web").json()["d"]
+        record.pop("__metadata", None)
+        self._append("webs.jsonl", record)
+        self._count("webs")
+        return [(self.subwebs, (web_url + "/_api/web/webs",)), (self.lists, (web_url, web_url + "/_api/web/lists"))]
+
+    def subwebs(self, url):
+        data = self._get(url).json()["d"]
+        tasks = [(self.web, (record["Url"],)) for record in data["results"]]
+        if "__next" in data:
+            tasks.append((self.subwebs, (data["__next"],)))
+        return tasks
+
+    def lists(self, web_url, url):
+        data = self._get(url).json()["d"]
+        tasks = []
+        for record in data["results"]:
+            record.pop("__metadata", None)
+            record["WebUrl"] = web_url
+            self._append("lists.jsonl", record)
+            self._count("lists")
+
+            list_id = record["Id"]
+            items_url = (web_url + f"/_api/web/lists(guid'{list_id}')/items"
+                         + f"?$select=*,FileRef,FileLeafRef,FSObjType&$top={self.page_size}")
+            since = self.state.get(list_id)
+            if since:
+                items_url += f"&$filter=Modified gt datetime'{since}'"
+            # Start this list over from its last checkpoint; its first page is outstanding
+            open(os.path.join(self.export_folder, "items", list_id + ".part.jsonl"), "w").close()
+            with self._lock:
+                self._progress[list_id] = {"pending": 1, "latest": since, "failed": False}
+            tasks.append((self.items, (web_url, list_id, items_url, since)))
+        if "__next" in data:
+            tasks.append((self.lists, (web_url, data["__next"])))
+        return tasks
+
+    def items(self, web_url, list_id, url, latest):
+        try:
+            data = self._get(url).json()["d"]
+        except Exception:
+            self._finished(list_id, failed=True)
+            raise
+        tasks = []
+        part = os.path.join(self.export_folder, "items", list_id + ".part.jsonl")
+        with open(part, "a", encoding="utf-8") as file:
+            for record in data["results"]:
+                record.pop("__metadata", None)
+                file.write(json.dumps(record) + "\n")
+                if record.get("Modified") and (latest is None or record["Modified"] > latest):
+                    latest = record["Modified"]
+                if record.get("FSObjType") == 0 and record.get("FileRef"):
+                    tasks.append((self.file, (web_url, list_id, record["FileRef"])))
+        self._count("items", len(data["results"]))
+
+        if "__next" in data:
+            tasks.append((self.items, (web_url, list_id, data["__next"], latest)))
+        else:
+            with self._lock:
+                self._progress[list_id]["latest"] = latest
+
+        # This page is done; the next page and the downloads it found are now outstanding
+        self._started(list_id, len(tasks))
+        self._finished(list_id)
+        return tasks
+
+    def file(self, web_url, list_id, file_ref):
+        path = os.path.join(self.export_folder, "files", *file_ref.strip("/").split("/"))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            literal = quote(file_ref.replace("'", "''"), safe="/")
+            with self._get(web_url + f"/_api/web/GetFileByServerRelativeUrl('{literal}')/$value", stream=True) as response:
+                # A temporary name per thread, as the same document can be downloaded by two tasks at once
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        file.write(chunk)
+            os.replace(tmp, path)
+        except Exception:
+            self._finished(list_id, failed=True)
+            raise
+        self._count("files")
+        self._finished(list_id)
+        return []
+
+    def run(self):
+        os.makedirs(os.path.join(self.export_folder, "items"), exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self.web, self.site_url)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    # A failed task only holds back its own list's checkpoint; the crawl goes on
+                    try:
+                        tasks = future.result()
+                    except Exception as error:
+                        self.failures.append(error)
+                        continue
+                    for function, args in tasks:
+                        pending.add(executor.submit(function, *args))
+        return self.stats
+
 
-# Get the data for the SharePoint 2013 site
-response = requests.get(site_url + "/_api/web", auth=auth)
+def main():
+    export = SiteExport(site_url, username, password, export_folder)
+    stats = export.run()
+    print(f"Exported {stats['webs']} webs, {stats['lists']} lists, {stats['items']} items and {stats['files']} files to {export_folder}")
+    for error in export.failures:
+        print("Failed, will be retried on the next run:", error)
 
-# Save the site data to a file
-with open("site_data.xml", "w") as file:
-    file.write(response.text)
+if __name__ == "__main__":
+    main()
 '''
-This script uses the requests library to send an HTTP GET 
-request to the SharePoint 2013 site's REST API. It first 
-authenticates to the site using the site URL, username, 
-and password, and then retrieves the site data using the
-"web" API call. It then saves the site data to a local 
-file named "site_data.xml".
+This script uses the requests library to crawl a SharePoint 2013
+site through its REST API. It authenticates with the site URL,
+username and password, then walks the site's webs, lists, list
+items and documents, following the "__next" links of paged
+results, and writes everything under the "site_export" folder
+as newline-delimited JSON plus the document files themselves.
+Running it again only fetches items modified since the last run.
 
 Once you have downloaded the SharePoint 2013 site data,
-you can use the same script from my previous answer to 
-upload the site data to the SharePoint 2016 site. However, 
-keep in mind that this may not preserve all site customizations
-or configurations, and you may need to manually update or 
-configure the SharePoint 2016 site after the upload.
+you can use shp2013to2016.py to upload the exported files to
+the SharePoint 2016 site. However, keep in mind that this may
+not preserve all site customizations or configurations, and you
+may need to manually update or configure the SharePoint 2016
+site after the upload.
 '''
@@ -1,82 +1,211 @@
 #this is from a medium article that I found intersting and thought others would like it too :
 #https://medium.com/@gabrielmasantos/how-i-build-a-stock-price-forecasting-model-using-chatgpt-e2ce5838f25f 
 
-import yfinance as yf
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import matplotlib.pyplot as plt
 from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
 from sklearn.metrics import mean_absolute_error
 from sklearn.model_selection import TimeSeriesSplit
 import numpy as np
 
-# Define the ticker symbol
-ticker = 'SPY'
+import pricestore
 
-# Download historical data
-data = yf.download(ticker, start='2000-01-01')
+# Fitted models are kept here as <TICKER>/<settings digest>/<first data date>_<last data date>.json
+model_cache_dir = os.environ.get('PROPHET_MODEL_CACHE', os.path.join(os.path.expanduser('~'), '.prophet_models'))
 
-# Prepare the data for Prophet
-data = data[['Close']]
-data.reset_index(inplace=True)  
-data.columns = ['ds', 'y']
-data.loc[:, 'MA'] = data['y'].rolling(window=200).mean()
-data.loc[:, 'Indicator'] = np.where(data['y'] > data['MA'], 'Buy', 'Sell')
+# Arguments every Prophet model here is built with; part of the model cache key
+prophet_settings = {'yearly_seasonality': True}
 
 # Define custom scoring function
 def score_func(y_true, y_pred):
     return mean_absolute_error(y_true, y_pred)
 
-# Initialize the TimeSeriesSplit object
-tscv = TimeSeriesSplit(n_splits=5)
-
-# Initialize an empty list to store the scores
-scores = []
 
-# Iterate through the splits of the data
-for train_index, test_index in tscv.split(data):
-    # Get the training and testing data for this split
-    train_data = data.iloc[train_index]
-    test_data = data.iloc[test_index]
+def prepare_data(ticker, start='2000-01-01'):
+    # Download historical data
+    data = pricestore.load_prices(ticker, start)
 
-    # Fit the model on the training data
-    m = Prophet(yearly_seasonality=True)
-    m.fit(train_data)
+    # Prepare the data for Prophet
+    data = data[['Close']]
+    data.reset_index(inplace=True)
+    data.columns = ['ds', 'y']
+    data.loc[:, 'MA'] = data['y'].rolling(window=200).mean()
+    data.loc[:, 'Indicator'] = np.where(data['y'] > data['MA'], 'Buy', 'Sell')
+    return data
 
-    # Make predictions on the test data
-    future = m.make_future_dataframe(periods=365 * 5)
-    forecast = m.predict(future)
-    test_predictions = forecast.iloc[-len(test_data):][['yhat']]
 
-    # Calculate the score for this split
-    score = score_func(test_data[['y']], test_predictions)
+def warm_start_params(m):
+    # Fitted parameters of m in the form Prophet.fit(init=...) expects
+    params = {}
+    for name in ['k', 'm', 'sigma_obs']:
+        params[name] = m.params[name][0][0] if m.mcmc_samples == 0 else np.mean(m.params[name])
+    for name in ['delta', 'beta']:
+        params[name] = m.params[name][0] if m.mcmc_samples == 0 else np.mean(m.params[name], axis=0)
+    return params
 
-    # Append the score to the scores list
-    scores.append(score)
 
-# Calculate the mean score
-mean_score = sum(scores) / len(scores)
+def fit_fold(train_data, test_data, init=None):
+    # Fit the model on the training data
+    fit_start = time.perf_counter()
+    m = Prophet(**prophet_settings)
+    if init is None:
+        m.fit(train_data)
+    else:
+        m.fit(train_data, init=init)
+    fit_time = time.perf_counter() - fit_start
+
+    # Make predictions on the test dates only
+    predict_start = time.perf_counter()
+    forecast = m.predict(test_data[['ds']])
+    predict_time = time.perf_counter() - predict_start
 
-# Fit the model with all the data
-m = Prophet(yearly_seasonality=True)
-m.fit(data)
+    # Calculate the score for this split
+    score = score_func(test_data['y'], forecast['yhat'])
+
+    return {'score': score, 'fit_time': fit_time, 'predict_time': predict_time, 'params': warm_start_params(m)}
+
+
+def cross_validate(data, n_splits=5, workers=None, warm_start=False):
+    # With warm_start each fold starts from the previous fold's parameters, so the folds
+    # run one after another; otherwise they are fitted in parallel processes.
+    tscv = TimeSeriesSplit(n_splits=n_splits)
+    folds = [(data.iloc[train_index], data.iloc[test_index]) for train_index, test_index in tscv.split(data)]
+
+    with ProcessPoolExecutor(max_workers=workers or min(n_splits, os.cpu_count())) as executor:
+        if warm_start:
+            results = []
+            init = None
+            for train_data, test_data in folds:
+                result = executor.submit(fit_fold, train_data, test_data, init).result()
+                init = result['params']
+                results.append(result)
+        else:
+            futures = [executor.submit(fit_fold, train_data, test_data) for train_data, test_data in folds]
+            results = [future.result() for future in futures]
+
+    for fold, result in enumerate(results):
+        print(f"Fold {fold}: score {result['score']:.4f}, fit {result['fit_time']:.2f}s, predict {result['predict_time']:.2f}s")
+
+    return results
+
+
+def cached_model(ticker, data, cache_dir=model_cache_dir, warm_start=False, settings=prophet_settings):
+    # Fitted model for data, loaded from the cache when the same date range has been fitted before
+    # with the same Prophet settings. Returns (model, fitted); only the newest model of each
+    # ticker, start date and settings is kept.
+    if data.empty:
+        raise ValueError(f"No price data for {ticker}")
+    first_date = data['ds'].iloc[0].strftime('%Y-%m-%d')
+    last_date = data['ds'].iloc[-1].strftime('%Y-%m-%d')
+    digest = hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=8).hexdigest()
+    folder = os.path.join(cache_dir, ticker.upper(), digest)
+    path = os.path.join(folder, f'{first_date}_{last_date}.json')
+    if os.path.exists(path):
+        with open(path) as file:
+            return model_from_json(file.read()), False
+
+    previous = sorted(glob.glob(os.path.join(folder, f'{first_date}_*.json')))
+    m = Prophet(**settings)
+    if warm_start and previous:
+        # New bars since the last fit: start from the previous model's parameters
+        with open(previous[-1]) as file:
+            m.fit(data, init=warm_start_params(model_from_json(file.read())))
+    else:
+        m.fit(data)
+
+    os.makedirs(folder, exist_ok=True)
+    with open(path + '.tmp', 'w') as file:
+        file.write(model_to_json(m))
+    os.replace(path + '.tmp', path)
+    for old in previous:
+        os.remove(old)
+    return m, True
+
+
+def _forecast_ticker(ticker, data, horizon, cache_dir, warm_start):
+    started = time.perf_counter()
+    m, fitted = cached_model(ticker, data, cache_dir, warm_start)
+    future = m.make_future_dataframe(periods=horizon, include_history=False)
+    prediction = m.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+    return prediction, fitted, time.perf_counter() - started
+
+
+def forecast(tickers, horizon=30, start='2000-01-01', workers=None, cache_dir=model_cache_dir, warm_start=False):
+    # {ticker: DataFrame of ds, yhat, yhat_lower, yhat_upper} for the next horizon days. Tickers are
+    # fitted (or loaded from the model cache when no new data has arrived) in parallel processes.
+    # Prices are read here, so only one process writes to the price store.
+    if not tickers:
+        return {}
+    data = {ticker: prepare_data(ticker, start) for ticker in tickers}
+
+    forecasts = {}
+    with ProcessPoolExecutor(max_workers=workers or min(len(tickers), os.cpu_count())) as executor:
+        futures = {ticker: executor.submit(_forecast_ticker, ticker, data[ticker], horizon, cache_dir, warm_start)
+                   for ticker in tickers}
+        for ticker, future in futures.items():
+            forecasts[ticker], fitted, elapsed = future.result()
+            print(f"{ticker}: {'fitted' if fitted else 'cached model'}, {elapsed:.2f}s")
+
+    return forecasts
+
+
+def main():
+    # Define the ticker symbol
+    ticker = 'SPY'
+    warm_start = False  # Start each fold (and the final fit) from the previous fitted parameters
+
+    # Set to a list of tickers (e.g. ['SPY', 'QQQ', 'IWM']) to forecast them instead; cached models are
+    # reused and a ticker is only refitted when new data has arrived
+    watchlist = None
+    if watchlist:
+        for symbol, symbol_forecast in forecast(watchlist, horizon=30, warm_start=warm_start).items():
+            print(symbol)
+            print(symbol_forecast.tail())
+        return
+
+    data = prepare_data(ticker)
+
+    results = cross_validate(data, n_splits=5, warm_start=warm_start)
+    scores = [result['score'] for result in results]
+
+    # Calculate the mean score
+    mean_score = sum(scores) / len(scores)
+
+    # Fit the model with all the data
+    m = Prophet(**prophet_settings)
+    if warm_start:
+        m.fit(data, init=results[-1]['params'])
+    else:
+        m.fit(data)
+
+    # Create a dataframe to hold predictions
+    future = m.make_future_dataframe(periods=365 * 5)
+    prediction = m.predict(future)
 
-# Create a dataframe to hold predictions
-future = m.make_future_dataframe(periods=365 * 5)
-forecast = m.predict(future)
+    # Plot the forecast
+    plt.figure(figsize=(15, 8))
+    fig1 = m.plot(prediction)
 
-# Plot the forecast
-plt.figure(figsize=(15, 8))
-fig1 = m.plot(forecast)
+    # Add labels and a title to the graph
+    plt.xlabel('Date')
+    plt.ylabel('Price')
+    plt.title('Stock Price with Buy and Sell Indicators')
 
-# Add labels and a title to the graph
-plt.xlabel('Date')
-plt.ylabel('Price')
-plt.title('Stock Price with Buy and Sell Indicators')
+    # Add gridlines to the graph
+    plt.grid(True)
 
-# Add gridlines to the graph
-plt.grid(True)
+    # Print the mean score
+    print("Cross Validation Score : ", mean_score)
 
-# Print the mean score
-print("Cross Validation Score : ", mean_score)
+    # Show the plot
+    plt.show()
 
-# Show the plot
-plt.show()
+if __name__ == "__main__":
+    main()
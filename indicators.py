@@ -0,0 +1,111 @@
+#indicators.py
+'''
+Memoized rolling means shared across walk-forward windows and runs.
+
+IndicatorCache computes each window length's trailing mean once over the full
+price history and serves every (start, stop) window from it. With warm=False
+a window's first rows restart the mean at its left edge, exactly like running
+rolling(min_periods=1) on the slice on its own (what walk_forward_optimization
+has always done); with warm=True they keep the history before the window, so
+the means are warmed up at the edge.
+
+Entries are full-history arrays keyed by a fingerprint of the price series and
+the window length. They are read-only, so mean() hands out the cached array
+itself, and they are evicted least recently used first once the cache holds
+more than max_bytes. means() is not zero-copy: it gathers the requested rows
+of every window into a new (rows x windows) matrix, one pass over its output,
+instead of recomputing any rolling sums. A second walk-forward run over the
+same prices, e.g. with another num_windows, computes nothing again.
+'''
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = int(os.environ.get('INDICATOR_CACHE_BYTES', 256 * 1024 * 1024))
+
+
+def series_key(close):
+    # Fingerprint of a price series; compute it once and pass it as key= for repeated lookups
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    return len(close), hashlib.blake2b(close.view(np.uint8), digest_size=16).hexdigest()
+
+
+class IndicatorCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def _get(self, key, compute):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = compute()
+        entry.flags.writeable = False
+        self._entries[key] = entry
+        self.nbytes += entry.nbytes
+        # The newest entry is always kept, even on its own over max_bytes
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return entry
+
+    def _csum(self, close, key):
+        def compute():
+            csum = np.empty(len(close) + 1)
+            csum[0] = 0.0
+            np.cumsum(close, out=csum[1:])
+            return csum
+
+        return self._get((key, 'csum'), compute)
+
+    def mean(self, close, window, key=None):
+        # Full-history rolling(window, min_periods=1).mean() as a read-only array
+        close = np.asarray(close, dtype=np.float64)
+        key = key or series_key(close)
+        window = int(window)
+
+        def compute():
+            csum = self._csum(close, key)
+            end = np.arange(1, len(close) + 1)
+            return (csum[end] - csum[np.maximum(end - window, 0)]) / np.minimum(end, window)
+
+        return self._get((key, window), compute)
+
+    def means(self, close, windows, start=0, stop=None, warm=False, key=None):
+        # (mavg, columns) like macross.rolling_means(close[start:stop], windows), copied into a new
+        # matrix from the cached full-history means. Only the first window - 1 rows of each column differ between
+        # warm and cold windows, so those are the only rows recomputed for a cold window.
+        close = np.asarray(close, dtype=np.float64)
+        key = key or series_key(close)
+        stop = len(close) if stop is None else stop
+        windows = sorted(set(int(w) for w in windows))
+
+        mavg = np.empty((stop - start, len(windows)))
+        for col, window in enumerate(windows):
+            mavg[:, col] = self.mean(close, window, key)[start:stop]
+
+        if not warm and start > 0:
+            csum = self._csum(close, key)
+            for col, window in enumerate(windows):
+                head = min(window - 1, stop - start)
+                end = np.arange(start + 1, start + head + 1)
+                mavg[:head, col] = (csum[end] - csum[start]) / (end - start)
+
+        return mavg, {window: col for col, window in enumerate(windows)}
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+
+# Shared by every caller in the process unless one passes its own cache
+default_cache = IndicatorCache()
@@ -0,0 +1,181 @@
+#instrumentation.py
+'''
+Low-overhead instrumentation for the long-running optimizations.
+
+Off by default. Turn it on with enable() (and off again with disable()) or
+with the BACKTEST_INSTRUMENT environment variable:
+
+    BACKTEST_INSTRUMENT=1         per-stage timers, evaluation counts and a
+                                  throughput/ETA progress line on stderr
+    BACKTEST_INSTRUMENT=profile   the same plus cProfile and tracemalloc
+
+grid_search, grid_search_for_selling and walk_forward_optimization take
+instrument=True/False to switch it on or off for that call only; the previous
+state comes back when the call returns, and the default None leaves it as is.
+
+A report of the timers (and the profiles) is written when the process exits,
+to stderr or to BACKTEST_INSTRUMENT_REPORT if set. While disabled, stage()
+and progress() hand back shared no-op objects, so the instrumented code pays
+one function call per chunk of work and nothing else.
+'''
+import atexit
+import contextlib
+import io
+import os
+import sys
+import time
+
+enabled = False
+profiling = False
+
+timers = {}  # stage name -> [calls, seconds]
+evaluations = 0
+
+_null_stage = contextlib.nullcontext()
+_profiler = None
+_report_path = None
+_registered = False
+
+
+class _Stage:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        timer = timers.setdefault(self.name, [0, 0.0])
+        timer[0] += 1
+        timer[1] += time.perf_counter() - self.started
+
+
+def stage(name):
+    # with stage('signal'): ... adds the block's wall time to the 'signal' timer
+    if not enabled:
+        return _null_stage
+    return _Stage(name)
+
+
+def count(n):
+    global evaluations
+    if enabled:
+        evaluations += n
+
+
+class Progress:
+    # Prints done/total, throughput and ETA at most every interval seconds
+    def __init__(self, label, total, interval=2.0):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self._printed = self.started
+
+    def update(self, n=1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self._printed >= self.interval or self.done >= self.total:
+            self._printed = now
+            elapsed = now - self.started
+            rate = self.done / elapsed if elapsed > 0 else float('inf')
+            eta = (self.total - self.done) / rate if rate > 0 else float('inf')
+            print(f"{self.label}: {self.done}/{self.total} ({self.done / max(self.total, 1):.0%}), "
+                  f"{rate:,.0f}/s, ETA {eta:.1f}s", file=sys.stderr)
+
+
+class _NullProgress:
+    def update(self, n=1):
+        pass
+
+
+_null_progress = _NullProgress()
+
+
+def progress(label, total):
+    if not enabled:
+        return _null_progress
+    return Progress(label, total)
+
+
+def report():
+    lines = [f"evaluations: {evaluations}"]
+    total = sum(seconds for _, seconds in timers.values())
+    for name, (calls, seconds) in sorted(timers.items(), key=lambda item: -item[1][1]):
+        lines.append(f"{name:12s} {calls:8d} calls {seconds:10.3f}s {seconds / total if total else 0:6.1%}")
+    if evaluations and total:
+        lines.append(f"throughput: {evaluations / total:,.0f} evaluations/s")
+    return '\n'.join(lines)
+
+
+def _write_report():
+    text = report()
+    if _profiler is not None:
+        import pstats
+        import tracemalloc
+
+        _profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(_profiler, stream=stream).sort_stats('cumulative').print_stats(30)
+        text += '\n\n' + stream.getvalue()
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            text += '\nTop allocations:\n' + '\n'.join(str(stat) for stat in snapshot.statistics('lineno')[:15])
+            text += f"\nPeak traced memory: {tracemalloc.get_traced_memory()[1] / 1e6:.1f} MB"
+            tracemalloc.stop()
+
+    if _report_path:
+        with open(_report_path, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text, file=sys.stderr)
+
+
+def enable(profile=False, report_path=None):
+    global enabled, profiling, _profiler, _report_path, _registered
+    if not _registered:
+        atexit.register(_write_report)
+        _registered = True
+    enabled = True
+    _report_path = report_path or os.environ.get('BACKTEST_INSTRUMENT_REPORT') or _report_path
+
+    if profile and not profiling:
+        import cProfile
+        import tracemalloc
+
+        profiling = True
+        tracemalloc.start()
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def disable():
+    # Stops collecting; what was collected so far is still reported at exit
+    global enabled
+    enabled = False
+
+
+@contextlib.contextmanager
+def switched(instrument):
+    # with switched(instrument): turns instrumentation on (True) or off (False) for the block only
+    global enabled
+    if instrument is None:
+        yield
+        return
+    previous = enabled
+    if instrument:
+        enable()
+    else:
+        disable()
+    try:
+        yield
+    finally:
+        enabled = previous
+
+
+_setting = os.environ.get('BACKTEST_INSTRUMENT', '').lower()
+if _setting and _setting not in ('0', 'false', 'no'):
+    enable(profile=_setting == 'profile')
@@ -0,0 +1,354 @@
+#macross.py
+'''
+Batched moving average crossover engine.
+
+Every window length's moving average is computed once from a single cumulative
+sum of the closing prices. All valid (short, long) pairs are then evaluated
+together as the columns of a 2-D signal matrix (dates x pairs), chunked over
+pairs so memory stays bounded on long histories.
+
+The numbers match moving_average_cross_strategy(), calculate_performance() and
+get_performance_metrics() in optgpt.py / walkforward.py up to floating point
+rounding of the rolling means.
+'''
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+Portfolio = namedtuple('Portfolio', ['holdings', 'cash', 'total', 'returns'])
+
+# Upper bound on the number of cells in one dates x pairs chunk (~32 MB of float64)
+DEFAULT_CHUNK_CELLS = 4_000_000
+
+# evaluate_windows() sums a window's trades as a difference of full-history running sums, so pairs
+# that tie exactly on the window alone can differ by rounding; collect_results() treats performances
+# this close to the best as ties
+WINDOW_TIE_TOLERANCE = 1e-12
+
+
+def rolling_means(close, windows):
+    # Trailing means with min_periods=1, i.e. data['Close'].rolling(window=w, min_periods=1).mean()
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    windows = sorted(set(int(w) for w in windows))
+
+    csum = np.empty(n + 1)
+    csum[0] = 0.0
+    np.cumsum(close, out=csum[1:])
+    end = np.arange(1, n + 1)
+
+    mavg = np.empty((n, len(windows)))
+    for col, window in enumerate(windows):
+        start = np.maximum(end - window, 0)
+        mavg[:, col] = (csum[end] - csum[start]) / np.minimum(end, window)
+
+    return mavg, {window: col for col, window in enumerate(windows)}
+
+
+def valid_pairs(short_ma_values, long_ma_values):
+    # Same order as the nested loops in grid_search()
+    return [(short_ma, long_ma) for short_ma in short_ma_values for long_ma in long_ma_values if long_ma > short_ma]
+
+
+def signal_matrix(mavg, columns, pairs):
+    # signal is 1.0 where short_mavg > long_mavg, forced to 0.0 for the first short_window rows
+    n = mavg.shape[0]
+    short_cols = [columns[short_ma] for short_ma, _ in pairs]
+    long_cols = [columns[long_ma] for _, long_ma in pairs]
+    short_windows = np.array([short_ma for short_ma, _ in pairs])
+
+    signal = mavg[:, short_cols] > mavg[:, long_cols]
+    signal &= np.arange(n)[:, None] >= short_windows[None, :]
+    return signal
+
+
+def position_matrix(signal):
+    # signal.diff(), with the leading NaN row pandas produces
+    positions = np.empty(signal.shape)
+    positions[0] = np.nan
+    steps = signal.view(np.int8)
+    np.subtract(steps[1:], steps[:-1], out=positions[1:], casting='unsafe')
+    return positions
+
+
+def holding_period_filter(dates, positions, holding_days=(5, 15, 30)):
+    # Keep a sell (-1) only if it comes exactly 5, 15 or 30 calendar days after the last buy (+1)
+    # at or before it, for every column of positions at once. Modifies positions in place.
+    n = positions.shape[0]
+    days = np.asarray(dates, dtype='datetime64[ns]').astype(np.int64) // 86_400_000_000_000
+
+    last_buy = np.where(positions == 1, np.arange(n)[:, None], -1)
+    np.maximum.accumulate(last_buy, axis=0, out=last_buy)
+
+    days_held = days[:, None] - days[np.maximum(last_buy, 0)]
+    keep = (last_buy >= 0) & np.isin(days_held, holding_days)
+    positions[(positions == -1) & ~keep] = 0
+    return positions
+
+
+def overall_performance(close, positions, shares):
+    # Final total / initial total - 1 of calculate_performance() for every column of positions
+    close = np.asarray(close, dtype=np.float64)
+    initial_capital = float(shares * close[0])
+    if len(close) < 2:
+        return np.zeros(positions.shape[1])
+
+    # cash[-1] = initial - shares * sum_{k>=2} (p[k] - p[k-1]) * close[k]
+    traded = close[2:] @ positions[2:] - close[2:] @ positions[1:-1]
+    holdings = positions[-1] * close[-1]
+    total = initial_capital + shares * (holdings - traded)
+    return total / initial_capital - 1
+
+
+def portfolio_buffers(n, dtype=np.float64):
+    # Reusable output buffer for portfolio_arrays(); one row each for holdings, cash, total, returns
+    return np.empty((4, n), dtype=dtype)
+
+
+def portfolio_arrays(close, positions, shares, out=None, dtype=np.float64, as_frame=False, index=None, ticker='SPY'):
+    # calculate_performance() on contiguous arrays. With out (see portfolio_buffers) nothing is
+    # allocated per call; the returned arrays are views into out and are overwritten by the next call.
+    close = np.ascontiguousarray(close, dtype=dtype)
+    positions = np.ascontiguousarray(positions, dtype=dtype)
+    n = len(close)
+    if out is None:
+        out = portfolio_buffers(n, dtype)
+    holdings, cash, total, returns = out[0, :n], out[1, :n], out[2, :n], out[3, :n]
+    initial_capital = close[0] * shares
+
+    np.multiply(positions, close, out=holdings)
+    np.nan_to_num(holdings, copy=False)
+    holdings *= shares
+
+    # cash = initial - cumsum(positions.diff() * close), NaN trades counted as zero
+    cash[0] = initial_capital
+    np.subtract(positions[1:], positions[:-1], out=cash[1:])
+    cash[1:] *= close[1:]
+    np.nan_to_num(cash[1:], copy=False)
+    np.cumsum(cash[1:], out=cash[1:])
+    cash[1:] *= -shares
+    cash[1:] += initial_capital
+
+    np.add(cash, holdings, out=total)
+
+    # total.pct_change()
+    returns[0] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.divide(total[1:], total[:-1], out=returns[1:])
+    returns[1:] -= 1
+
+    if not as_frame:
+        return Portfolio(holdings, cash, total, returns)
+
+    return pd.DataFrame({ticker: shares * positions * close, 'holdings': holdings, 'cash': cash,
+                         'total': total, 'returns': returns}, index=index)
+
+
+def performance_metrics(returns, total):
+    # get_performance_metrics() without the long_ma field: (overall_performance, total_trades,
+    # positive_trades, negative_trades, average_positive_return, average_negative_return,
+    # total_profit, total_loss). With dates x pairs matrices every field is an array, one per column.
+    returns = np.asarray(returns, dtype=np.float64)
+    total = np.asarray(total, dtype=np.float64)
+
+    positive = returns > 0
+    negative = returns < 0
+    total_trades = np.count_nonzero(~np.isnan(returns), axis=0)
+    positive_trades = np.count_nonzero(positive, axis=0)
+    negative_trades = np.count_nonzero(negative, axis=0)
+    total_profit = np.sum(returns, axis=0, where=positive)
+    total_loss = np.sum(returns, axis=0, where=negative)
+
+    # Mean of an empty selection is NaN, as in pandas
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average_positive_return = total_profit / positive_trades
+        average_negative_return = total_loss / negative_trades
+        overall_performance = total[-1] / total[0] - 1
+
+    return (overall_performance, total_trades, positive_trades, negative_trades, average_positive_return,
+            average_negative_return, total_profit, total_loss)
+
+
+def cross_positions(close, short_ma, long_ma):
+    # positions column of moving_average_cross_strategy() for a single pair
+    mavg, columns = rolling_means(close, (short_ma, long_ma))
+    return position_matrix(signal_matrix(mavg, columns, [(short_ma, long_ma)]))[:, 0]
+
+
+def evaluate_pairs(close, pairs, shares=4, position_filter=None, chunk_cells=DEFAULT_CHUNK_CELLS, buy_positions=None, on_chunk=None, means=None):
+    # on_chunk(chunk_pairs, chunk_performance) is called as each chunk finishes, e.g. to persist results.
+    # means=(mavg, columns) skips rolling_means(), e.g. when they come from an indicators.IndicatorCache
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    if means is None:
+        windows = {window for pair in pairs for window in pair}
+        means = rolling_means(close, windows)
+    mavg, columns = means
+
+    performance = np.empty(len(pairs))
+    chunk_size = max(1, chunk_cells // max(n, 1))
+    progress = instrumentation.progress('pairs', len(pairs))
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start:start + chunk_size]
+        with instrumentation.stage('signal'):
+            positions = position_matrix(signal_matrix(mavg, columns, chunk))
+            if buy_positions is not None:
+                # Sell crosses are subtracted from a fixed buy signal, as in grid_search_for_selling()
+                np.subtract(buy_positions[:, None], positions, out=positions)
+        if position_filter is not None:
+            with instrumentation.stage('sell_filter'):
+                positions = position_filter(positions)
+        with instrumentation.stage('accounting'):
+            performance[start:start + len(chunk)] = overall_performance(close, positions, shares)
+        instrumentation.count(len(chunk))
+        progress.update(len(chunk))
+        if on_chunk is not None:
+            on_chunk(chunk, performance[start:start + len(chunk)])
+
+    return performance
+
+
+def evaluate_windows(close, pairs, bounds, shares=4, means=None, chunk_cells=DEFAULT_CHUNK_CELLS):
+    # evaluate_pairs(close[start:stop], pairs) for every (start, stop) in bounds, as a bounds x pairs
+    # matrix. A window's signal equals the full history's once its longest mean has warmed up, so
+    # only its first max(window) + 2 rows are evaluated on their own; the trades after them come
+    # from one running sum over the full history, shared by every window. means(start, stop, windows)
+    # gives the (mavg, columns) of close[start:stop], e.g. from an indicators.IndicatorCache.
+    # Pick the best pairs with collect_results(..., tolerance=WINDOW_TIE_TOLERANCE) so exact ties on
+    # the window still go to the first pair.
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    windows = sorted({window for pair in pairs for window in pair})
+    if means is None:
+        def means(start, stop, windows):
+            return rolling_means(close[start:stop], windows)
+
+    head = max(windows) + 2
+    full_means = means(0, n, windows)
+    head_means = [means(start, min(start + head, stop), windows) for start, stop in bounds]
+
+    performance = np.empty((len(bounds), len(pairs)))
+    chunk_size = max(1, chunk_cells // max(2 * n, 1))
+    progress = instrumentation.progress('pairs', len(pairs))
+    for first in range(0, len(pairs), chunk_size):
+        chunk = pairs[first:first + chunk_size]
+        columns = slice(first, first + len(chunk))
+        with instrumentation.stage('signal'):
+            positions = position_matrix(signal_matrix(*full_means, chunk))
+
+        with instrumentation.stage('accounting'):
+            # traded[k] = sum over 2 <= j <= k of (positions[j] - positions[j - 1]) * close[j]
+            traded = np.zeros(positions.shape)
+            np.subtract(positions[2:], positions[1:-1], out=traded[2:])
+            traded[2:] *= close[2:, None]
+            np.cumsum(traded, axis=0, out=traded)
+
+            for row, ((start, stop), (mavg, mavg_columns)) in enumerate(zip(bounds, head_means)):
+                head_stop = start + mavg.shape[0]
+                window_positions = position_matrix(signal_matrix(mavg, mavg_columns, chunk))
+                if head_stop == stop:
+                    performance[row, columns] = overall_performance(close[start:stop], window_positions, shares)
+                    continue
+
+                head_close = close[start + 2:head_stop]
+                window_traded = (head_close @ window_positions[2:] - head_close @ window_positions[1:-1]
+                                 + traded[stop - 1] - traded[head_stop - 1])
+                initial_capital = float(shares * close[start])
+                total = initial_capital + shares * (positions[stop - 1] * close[stop - 1] - window_traded)
+                performance[row, columns] = total / initial_capital - 1
+
+        instrumentation.count(len(chunk) * len(bounds))
+        progress.update(len(chunk))
+
+    return performance
+
+
+def panel_sums(prices):
+    # Running sums and non-NaN counts per column of a dates x tickers price matrix
+    prices = np.asarray(prices, dtype=np.float64)
+    valid = ~np.isnan(prices)
+    csum = np.zeros((prices.shape[0] + 1, prices.shape[1]))
+    np.cumsum(np.where(valid, prices, 0.0), axis=0, out=csum[1:])
+    count = np.zeros(csum.shape)
+    np.cumsum(valid, axis=0, out=count[1:])
+    return csum, count
+
+
+def panel_rolling_mean(csum, count, window):
+    # Per-ticker trailing means with min_periods=1, skipping NaNs like pandas
+    end = np.arange(1, csum.shape[0])
+    start = np.maximum(end - window, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (csum[end] - csum[start]) / (count[end] - count[start])
+
+
+def panel_overall_performance(prices, positions, shares):
+    # overall_performance() per ticker column; rows before a ticker's first price are NaN
+    prices = np.asarray(prices, dtype=np.float64)
+    first = np.argmax(~np.isnan(prices), axis=0)
+    columns = np.arange(prices.shape[1])
+    initial_capital = shares * prices[first, columns]
+
+    traded = np.nansum(np.diff(positions, axis=0) * prices[1:], axis=0)
+    holdings = np.nan_to_num(positions[-1] * prices[-1])
+    total = initial_capital + shares * (holdings - traded)
+    return total / initial_capital - 1
+
+
+def panel_grid_search(prices, short_ma_values, long_ma_values, shares=4, position_filter=None):
+    # Every pair evaluated for every ticker at once. Each ticker behaves as if it were run on its
+    # own history: the signal warm-up and the NaN first positions row start at its first price.
+    prices = np.asarray(prices, dtype=np.float64)
+    n = prices.shape[0]
+    csum, count = panel_sums(prices)
+    first = np.argmax(~np.isnan(prices), axis=0)
+    rows = np.arange(n)[:, None]
+    before_first = rows <= first[None, :]
+
+    pairs = valid_pairs(short_ma_values, long_ma_values)
+    performance = np.empty((len(pairs), prices.shape[1]))
+    short_mavg = None
+    for row, (short_ma, long_ma) in enumerate(pairs):
+        if row == 0 or pairs[row - 1][0] != short_ma:
+            short_mavg = panel_rolling_mean(csum, count, short_ma)
+        signal = short_mavg > panel_rolling_mean(csum, count, long_ma)
+        signal &= rows >= first[None, :] + short_ma
+
+        positions = position_matrix(signal)
+        positions[before_first] = np.nan
+        if position_filter is not None:
+            positions = position_filter(positions)
+        performance[row] = panel_overall_performance(prices, positions, shares)
+
+    return pairs, performance
+
+
+def collect_results(pairs, performance, tolerance=0.0):
+    # best_pair and (short, long, performance) results, picking the first best like the original loops.
+    # With a tolerance the first pair within it of the best wins instead
+    best_performance = -np.inf
+    best_pair = None
+    results = []
+
+    with instrumentation.stage('metrics'):
+        for (short_ma, long_ma), current_performance in zip(pairs, np.asarray(performance).tolist()):
+            results.append((short_ma, long_ma, current_performance))
+
+            if current_performance > best_performance:
+                best_performance = current_performance
+                best_pair = (short_ma, long_ma)
+
+        if tolerance and best_pair is not None:
+            within = np.asarray(performance, dtype=np.float64) >= best_performance - tolerance
+            best_pair = tuple(pairs[int(np.argmax(within))])
+
+    return best_pair, results
+
+
+def grid_search(close, short_ma_values, long_ma_values, shares=4, position_filter=None, chunk_cells=DEFAULT_CHUNK_CELLS, buy_positions=None):
+    pairs = valid_pairs(short_ma_values, long_ma_values)
+    performance = evaluate_pairs(close, pairs, shares, position_filter, chunk_cells, buy_positions)
+    return collect_results(pairs, performance)
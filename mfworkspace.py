@@ -1,4 +1,9 @@
+import logging
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 from py3270 import Emulator
 
 # Replace 'your_host_address' with the mainframe's address
@@ -8,31 +13,181 @@ mainframe_address = 'your_host_address'
 username = 'username'
 password = 'password'
 
-emulator = Emulator(visible=True)  # Set visible to False to run in the background
-emulator.connect(mainframe_address)
+# Text that appears on the screen once the host asks for the password, and once login is done
+# (replace with what your host actually shows)
+password_prompt = 'PASSWORD'
+logged_in_text = 'READY'
+
+# Where each field sits on the account screen: name -> (row, column, length), 1-based like py3270
+account_fields = {
+    'account': (3, 20, 10),
+    'name': (4, 20, 30),
+    'balance': (6, 20, 15),
+}
+
+# Key that leaves an account screen and returns to the ready screen (a py3270 action such as PF(3) or Clear)
+return_action = 'PF(3)'
+
+# Number of logged-in sessions kept open, and how long to wait for a screen before giving up
+pool_size = 4
+screen_timeout = 30
+
+
+def screen_text(emulator):
+    # Current screen as a list of lines
+    return [line.decode('ascii', 'replace') if isinstance(line, bytes) else line
+            for line in emulator.exec_command(b'Ascii()').data]
+
+
+def wait_for_text(emulator, text, timeout=None, interval=0.05):
+    # Poll until the keyboard is unlocked and text is on the screen, instead of a fixed sleep
+    timeout = screen_timeout if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        emulator.wait_for_field()
+        if any(text in line for line in screen_text(emulator)):
+            return
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"{text!r} did not appear on the screen within {timeout}s")
+        time.sleep(interval)
+
+
+def login(emulator_factory=Emulator, address=mainframe_address, username=username, password=password):
+    emulator = emulator_factory(visible=False)
+    emulator.connect(address)
+
+    # Log in to the mainframe
+    emulator.wait_for_field()
+    emulator.send_string(username)
+    emulator.send_enter()
+    wait_for_text(emulator, password_prompt)
+    emulator.send_string(password)
+    emulator.send_enter()
+    wait_for_text(emulator, logged_in_text)
+    return emulator
+
+
+def return_to_ready(emulator, action=return_action):
+    emulator.exec_command(action.encode())
+    wait_for_text(emulator, logged_in_text)
+
 
-# Log in to the mainframe
-emulator.send_string(username)
-emulator.send_enter()
-time.sleep(1)
-emulator.send_string(password)
-emulator.send_enter()
+def parse_fields(lines, fields=account_fields):
+    return {name: lines[row - 1][column - 1:column - 1 + length].strip() for name, (row, column, length) in fields.items()}
 
-# Navigate to the specific account (replace 'account_command' with the appropriate command)
-account_command = 'account_command'
-emulator.send_string(account_command)
-emulator.send_enter()
 
-# Capture the screen
-screen_text = emulator.screen.get_text()
-print(screen_text)
+def _terminate(emulator):
+    try:
+        emulator.terminate()
+    except Exception:
+        logging.exception("Could not terminate a mainframe session")
 
-# Close the connection
-emulator.terminate()
+
+class SessionPool:
+    # Keeps size logged-in sessions and spreads account lookups across them in parallel threads.
+    # A session goes back to the pool only after a lookup succeeded and it is on the ready screen
+    # again; one whose screen state is unknown after an error is dropped and replaced by a new login.
+    def __init__(self, size=pool_size, emulator_factory=Emulator, address=mainframe_address, username=username, password=password):
+        self._login = lambda: login(emulator_factory, address, username, password)
+        self._sessions = queue.Queue()
+        self._lock = threading.Lock()
+
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            futures = [executor.submit(self._login) for _ in range(size)]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            # Don't leak the sessions that did log in
+            for future in futures:
+                if future.exception() is None:
+                    _terminate(future.result())
+            raise errors[0]
+
+        for future in futures:
+            self._sessions.put(future.result())
+        self.size = size
+        self._alive = size
+        # (account command, error) of every lookup_many() command that failed
+        self.failures = []
+
+    def _get(self):
+        while True:
+            try:
+                return self._sessions.get(timeout=1)
+            except queue.Empty:
+                with self._lock:
+                    if self._alive == 0:
+                        raise RuntimeError("No mainframe sessions left in the pool")
+
+    def _replace(self, emulator):
+        _terminate(emulator)
+        try:
+            replacement = self._login()
+        except Exception:
+            with self._lock:
+                self._alive -= 1
+            logging.exception("Could not log in a replacement mainframe session")
+            return
+        self._sessions.put(replacement)
+
+    def lookup(self, account_command, fields=account_fields, expected_text=None):
+        emulator = self._get()
+        try:
+            # Navigate to the specific account and wait for its screen instead of sleeping
+            emulator.send_string(account_command)
+            emulator.send_enter()
+            if expected_text:
+                wait_for_text(emulator, expected_text)
+            else:
+                emulator.wait_for_field()
+            result = parse_fields(screen_text(emulator), fields)
+            return_to_ready(emulator)
+        except Exception:
+            self._replace(emulator)
+            raise
+        self._sessions.put(emulator)
+        return result
+
+    def lookup_many(self, account_commands, fields=account_fields, expected_text=None):
+        # Results come back in the order of account_commands. A failed command gives None and is
+        # recorded in self.failures, so one bad account or timeout doesn't lose the rest of the batch
+        def lookup(command):
+            try:
+                return self.lookup(command, fields, expected_text)
+            except Exception as error:
+                with self._lock:
+                    self.failures.append((command, error))
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(lookup, account_commands))
+
+    def close(self):
+        while not self._sessions.empty():
+            _terminate(self._sessions.get())
+        with self._lock:
+            self._alive = 0
+
+
+def main():
+    # Replace with the commands that open each account (e.g. read from a file)
+    account_commands = ['account_command']
+
+    pool = SessionPool()
+    try:
+        for command, fields in zip(account_commands, pool.lookup_many(account_commands)):
+            if fields is not None:
+                print(command, fields)
+        for command, error in pool.failures:
+            print("Lookup failed:", command, error)
+    finally:
+        # Close the connections
+        pool.close()
+
+if __name__ == "__main__":
+    main()
 '''
 pip install py3270
 Reflection Workspace using external libraries. One approach is to use a library like 'py3270' (for IBM mainframes) or 'pyte' (for generic terminal emulation) to establish a connection with the host system and perform actions like navigating through screens or sending commands.
 
-Here is a simple example using 'py3270' to connect to a mainframe, log in, navigate to a specific account, and capture the screen
+This script uses 'py3270' to keep a small pool of logged-in sessions, wait for each screen to be ready instead of sleeping, and look up many accounts in parallel, returning the parsed fields of each account screen.
 '''
-
@@ -1,9 +1,14 @@
 import pandas as pd
-import yfinance as yf
 import numpy as np
 import csv
 from datetime import datetime, timedelta
 
+import instrumentation
+import macross
+import paramsearch
+import pricestore
+import resultstore
+
 def moving_average_cross_strategy(data, short_window, long_window):
     signals = pd.DataFrame(index=data.index)
     signals['signal'] = 0.0
@@ -19,51 +24,23 @@ def moving_average_cross_strategy(data, short_window, long_window):
 
 
 def apply_sell_conditions(data, signals):
-    sell_dates = signals[signals['positions'] == -1].index
-    for sell_date in sell_dates:
-        # Find the last buy signal date before the current sell signal date
-        previous_buy_dates = signals.loc[:sell_date].loc[signals['positions'] == 1].index
-
-        if len(previous_buy_dates) > 0:
-            buy_date = previous_buy_dates[-1]
-
-            # Check if the 5th, 15th, and 30th day conditions are met
-            days_held = (sell_date - buy_date).days
-            if days_held == 5 or days_held == 15 or days_held == 30:
-                continue
-            else:
-                signals.loc[sell_date, 'positions'] = 0
-        else:
-            signals.loc[sell_date, 'positions'] = 0
+    # A sell is kept only 5, 15 or 30 days after the last buy; see macross.holding_period_filter
+    positions = signals['positions'].to_numpy(dtype=float, copy=True)[:, None]
+    signals['positions'] = macross.holding_period_filter(signals.index, positions)[:, 0]
 
     return signals
 
 
-def calculate_performance(data, signals, shares):
-    initial_capital = float(shares * data['Close'].iloc[0])
-    positions = pd.DataFrame(index=signals.index).fillna(0.0)
-    positions['SPY'] = shares * signals['positions']
-
-    portfolio = positions.multiply(data['Close'], axis=0)
-    pos_diff = positions.diff()
-    portfolio['holdings'] = (positions.multiply(data['Close'], axis=0)).sum(axis=1)
-    portfolio['cash'] = initial_capital - (pos_diff.multiply(data['Close'], axis=0)).sum(axis=1).cumsum()
-    portfolio['total'] = portfolio['cash'] + portfolio['holdings']
-    portfolio['returns'] = portfolio['total'].pct_change()
-
-    return portfolio
+def calculate_performance(data, signals, shares, ticker="SPY"):
+    # Shared array kernel in macross.py; only the returned DataFrame is allocated per call
+    return macross.portfolio_arrays(data['Close'].to_numpy(), signals['positions'].to_numpy(), shares,
+                                    as_frame=True, index=signals.index, ticker=ticker)
 
 def get_performance_metrics(portfolio, long_ma):
-    total_trades = len(portfolio[portfolio['returns'].notnull()])
-    positive_trades = len(portfolio[portfolio['returns'] > 0])
-    negative_trades = len(portfolio[portfolio['returns'] < 0])
-    average_positive_return = portfolio[portfolio['returns'] > 0]['returns'].mean()
-    average_negative_return = portfolio[portfolio['returns'] < 0]['returns'].mean()
-    total_profit = portfolio[portfolio['returns'] > 0]['returns'].sum()
-    total_loss = portfolio[portfolio['returns'] < 0]['returns'].sum()
-    overall_performance = portfolio['total'].iloc[-1] / portfolio['total'].iloc[0] - 1
+    # All metrics come from one reduction over the returns array; see macross.performance_metrics
+    metrics = macross.performance_metrics(portfolio['returns'].to_numpy(), portfolio['total'].to_numpy())
 
-    return (long_ma, overall_performance, total_trades, positive_trades, negative_trades, average_positive_return, average_negative_return, total_profit, total_loss)
+    return (long_ma,) + metrics
 
 # Include the previously discussed functions here
 # moving_average_cross_strategy
@@ -71,57 +48,47 @@ def get_performance_metrics(portfolio, long_ma):
 # calculate_performance
 # get_performance_metrics
 
-def grid_search(data, short_ma_values, long_ma_values):
-    best_performance = -np.inf
-    best_pair = None
-    results = []
-
-    for short_ma in short_ma_values:
-        for long_ma in long_ma_values:
-            if long_ma > short_ma:
-                signals = moving_average_cross_strategy(data, short_ma, long_ma)
-                signals = apply_sell_conditions(data, signals)
-                portfolio = calculate_performance(data, signals, 4)
-                performance_metrics = get_performance_metrics(portfolio, long_ma)
+def grid_search(data, short_ma_values, long_ma_values, instrument=None, store=None, ticker="SPY"):
+    # Every pair is evaluated at once by the batched engine in macross.py.
+    # With a ResultStore, finished chunks are saved as they complete and pairs already stored are skipped
+    with instrumentation.switched(instrument):
+        close = data['Close'].to_numpy()
 
-                current_performance = performance_metrics[1]  # Overall Performance (index 1)
+        def sell_filter(positions):
+            return macross.holding_period_filter(data.index, positions)
 
-                results.append((short_ma, long_ma, current_performance))
+        def evaluate(pairs, stop, on_chunk=None):
+            return macross.evaluate_pairs(close, pairs, 4, sell_filter, on_chunk=on_chunk)
 
-                if current_performance > best_performance:
-                    best_performance = current_performance
-                    best_pair = (short_ma, long_ma)
+        if store is not None:
+            evaluate = store.cached(resultstore.search_key(ticker, data, 'buy'), evaluate, len(close))
 
-    return best_pair, results
+        pairs = macross.valid_pairs(short_ma_values, long_ma_values)
+        return macross.collect_results(pairs, evaluate(pairs, len(close)))
 
-def grid_search_for_selling(data, buy_short_ma, buy_long_ma, sell_short_ma_values, sell_long_ma_values):
-    best_performance = -np.inf
-    best_sell_pair = None
-    results = []
+def grid_search_for_selling(data, buy_short_ma, buy_long_ma, sell_short_ma_values, sell_long_ma_values, strategy='exhaustive', instrument=None, store=None, ticker="SPY", **options):
+    # Each sell pair's positions are subtracted from the buy pair's, then filtered in one batch.
+    # strategy picks how the sell grid is searched; see paramsearch.py
+    with instrumentation.switched(instrument):
+        close = data['Close'].to_numpy()
+        buy_positions = macross.cross_positions(close, buy_short_ma, buy_long_ma)
 
-    buy_signals = moving_average_cross_strategy(data, buy_short_ma, buy_long_ma)
+        def evaluate(pairs, stop, on_chunk=None):
+            def sell_filter(positions):
+                return macross.holding_period_filter(data.index[:stop], positions)
 
-    for sell_short_ma in sell_short_ma_values:
-        for sell_long_ma in sell_long_ma_values:
-            if sell_long_ma > sell_short_ma:
-                sell_signals = moving_average_cross_strategy(data, sell_short_ma, sell_long_ma)
-                combined_signals = buy_signals.copy()
-                combined_signals['sell_positions'] = -sell_signals['positions']
-                combined_signals['positions'] += combined_signals['sell_positions']
+            return macross.evaluate_pairs(close[:stop], pairs, 4, sell_filter, buy_positions=buy_positions[:stop], on_chunk=on_chunk)
 
-                combined_signals = apply_sell_conditions(data, combined_signals)
-                portfolio = calculate_performance(data, combined_signals, 4)
-                performance_metrics = get_performance_metrics(portfolio, sell_long_ma)
+        if store is not None:
+            evaluate = store.cached(resultstore.search_key(ticker, data, f'sell {buy_short_ma}/{buy_long_ma}'), evaluate, len(close))
 
-                current_performance = performance_metrics[1]  # Overall Performance (index 1)
+        pairs = macross.valid_pairs(sell_short_ma_values, sell_long_ma_values)
+        best_sell_pair, results, stats = paramsearch.search(evaluate, pairs, len(close), strategy, **options)
 
-                results.append((sell_short_ma, sell_long_ma, current_performance))
+        if strategy != 'exhaustive':
+            print(f"{strategy}: {stats['evaluations']:.1f} full-history evaluations instead of {stats['exhaustive']} ({stats['saved']:.1f} saved)")
 
-                if current_performance > best_performance:
-                    best_performance = current_performance
-                    best_sell_pair = (sell_short_ma, sell_long_ma)
-
-    return best_sell_pair, results
+        return best_sell_pair, results
 
 
 
@@ -130,22 +97,31 @@ def main():
     start_date = "2000-01-01"
     end_date = "2023-03-31"
 
-    data = yf.download(ticker, start=start_date, end=end_date)
+    # Served from the local price store; only missing date ranges are downloaded
+    data = pricestore.load_prices(ticker, start_date, end_date)
 
     short_ma_values = range(3, 50)  # Define a range of short MA values for buying
     long_ma_values = range(4, 51)  # Define a range of long MA values for buying
 
+    # Results are saved as the searches run; a rerun after a crash skips pairs already computed
+    store = resultstore.ResultStore()
+
     # Find the best buy pair
-    best_buy_pair, buy_results = grid_search(data, short_ma_values, long_ma_values)
+    best_buy_pair, buy_results = grid_search(data, short_ma_values, long_ma_values, store=store, ticker=ticker)
     print("Best performing moving average cross for buying:", best_buy_pair)
 
     sell_short_ma_values = range(3, 21)  # Define a range of short MA values for selling
     sell_long_ma_values = range(22, 51)  # Define a range of long MA values for selling
+    sell_search_strategy = 'exhaustive'  # or 'coarse_to_fine', 'halving', 'prune' (see paramsearch.py)
 
     # Find the best sell pair based on the best buy pair
-    best_sell_pair, sell_results = grid_search_for_selling(data, best_buy_pair[0], best_buy_pair[1], sell_short_ma_values, sell_long_ma_values)
+    best_sell_pair, sell_results = grid_search_for_selling(data, best_buy_pair[0], best_buy_pair[1], sell_short_ma_values, sell_long_ma_values, sell_search_strategy, store=store, ticker=ticker)
     print("Best performing moving average cross for selling:", best_sell_pair)
 
+    key = resultstore.search_key(ticker, data, f'sell {best_buy_pair[0]}/{best_buy_pair[1]}')
+    print("Top sell pairs:", store.top(*key, n=5))
+    store.close()
+
 
     # Optionally save results to CSV
     current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -154,8 +130,7 @@ def main():
     with open(file_name, mode='w', newline='') as file:
         writer = csv.writer(file)
         writer.writerow(['Short MA', 'Long MA', 'Overall Performance'])
-        for row in best_sell_pair:
-            writer.writerow(row)
+        writer.writerows(sell_results)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,124 @@
+#paramsearch.py
+'''
+Search strategies for the (short, long) moving average grid.
+
+Every strategy works with an evaluate(pairs, stop) callable that returns the
+overall performance of each pair on the first `stop` bars of history, and
+returns best_pair, results (as grid_search() does) plus a stats dict that
+reports how many full-history evaluations were spent compared with an
+exhaustive search.
+
+  exhaustive       every pair on the full history
+  coarse_to_fine   every `step`-th window on each axis, then hill-climbing
+                   around the best coarse pairs one window at a time
+  halving          successive halving: all pairs on a short prefix of
+                   history, the best 1/eta move on to a longer prefix
+  prune            pairs are scored on growing prefixes of history and every
+                   pair too far behind the prefix leader (relative to the
+                   median pair) is dropped as unlikely to catch up; the
+                   survivors run on the full history
+
+Signals and accounting only look backwards, so a pair's result on a prefix
+is exactly its running result at that bar of the full history. Only
+`exhaustive` is guaranteed to find the best pair; the others trade that
+guarantee for far fewer evaluations.
+'''
+import numpy as np
+
+import macross
+
+STRATEGIES = ('exhaustive', 'coarse_to_fine', 'halving', 'prune')
+
+
+def _lattice(pairs):
+    shorts = sorted({short_ma for short_ma, _ in pairs})
+    longs = sorted({long_ma for _, long_ma in pairs})
+    return shorts, longs
+
+
+def _finish(pairs, scores, cost, n):
+    # results in the original pair order, for every pair evaluated on the full history
+    evaluated = [pair for pair in pairs if pair in scores]
+    best_pair, results = macross.collect_results(evaluated, [scores[pair] for pair in evaluated])
+    stats = {'exhaustive': len(pairs), 'evaluations': cost / n, 'saved': len(pairs) - cost / n}
+    return best_pair, results, stats
+
+
+def exhaustive(evaluate, pairs, n):
+    performance = evaluate(pairs, n)
+    return _finish(pairs, dict(zip(pairs, performance.tolist())), len(pairs) * n, n)
+
+
+def coarse_to_fine(evaluate, pairs, n, step=4, top_k=3):
+    shorts, longs = _lattice(pairs)
+    valid = set(pairs)
+    scores = {}
+
+    def score(candidates):
+        candidates = [pair for pair in dict.fromkeys(candidates) if pair in valid and pair not in scores]
+        if candidates:
+            scores.update(zip(candidates, evaluate(candidates, n).tolist()))
+
+    score([(short_ma, long_ma) for short_ma in shorts[::step] for long_ma in longs[::step]])
+
+    # Hill-climb from the best coarse pairs, one window at a time on both axes (step only
+    # spaces out the coarse lattice)
+    starts = sorted(scores, key=lambda pair: -np.nan_to_num(scores[pair], nan=-np.inf))[:top_k]
+    for current in starts:
+        while True:
+            i, j = shorts.index(current[0]), longs.index(current[1])
+            neighbours = [(shorts[a], longs[b])
+                          for a in range(max(i - 1, 0), min(i + 2, len(shorts)))
+                          for b in range(max(j - 1, 0), min(j + 2, len(longs)))]
+            score(neighbours)
+            best = max((pair for pair in neighbours if pair in scores),
+                       key=lambda pair: np.nan_to_num(scores[pair], nan=-np.inf))
+            if not scores[best] > scores[current]:
+                break
+            current = best
+
+    return _finish(pairs, scores, len(scores) * n, n)
+
+
+def halving(evaluate, pairs, n, eta=3, min_fraction=1 / 27):
+    survivors = list(pairs)
+    stop = max(2, int(n * min_fraction))
+    cost = 0
+    while True:
+        performance = evaluate(survivors, stop)
+        cost += len(survivors) * stop
+        if stop >= n:
+            break
+        # Keep the best 1/eta of the pairs (in their original order) for the next, longer prefix
+        keep = max(1, -(-len(survivors) // eta))
+        ranked = np.argsort(-np.nan_to_num(performance, nan=-np.inf), kind='stable')[:keep]
+        survivors = [survivors[i] for i in sorted(ranked)]
+        stop = min(n, stop * eta)
+
+    return _finish(pairs, dict(zip(survivors, performance.tolist())), cost, n)
+
+
+def prune(evaluate, pairs, n, margin=1.0, fractions=(0.25, 0.5)):
+    survivors = list(pairs)
+    cost = 0
+    for fraction in fractions:
+        stop = max(2, int(n * fraction))
+        if len(survivors) <= 1 or stop >= n:
+            break
+        performance = np.nan_to_num(evaluate(survivors, stop), nan=-np.inf)
+        cost += len(survivors) * stop
+        # Drop every pair trailing the prefix leader by more than margin times the leader's lead
+        # over the median pair (margin=1 keeps roughly the upper half, smaller values prune harder)
+        leader = performance.max()
+        threshold = leader - margin * (leader - np.median(performance))
+        survivors = [pair for pair, current in zip(survivors, performance.tolist()) if current >= threshold]
+
+    performance = evaluate(survivors, n)
+    cost += len(survivors) * n
+    return _finish(pairs, dict(zip(survivors, performance.tolist())), cost, n)
+
+
+def search(evaluate, pairs, n, strategy='exhaustive', **options):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown search strategy {strategy!r}, expected one of {STRATEGIES}")
+    return globals()[strategy](evaluate, pairs, n, **options)
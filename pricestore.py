@@ -0,0 +1,200 @@
+#pricestore.py
+'''
+Local on-disk price history store in front of yf.download.
+
+Each ticker is kept as one directory of column files (dates.<version>.npy,
+Close.<version>.npy, ...) plus a meta.json naming the current version and
+listing the date ranges already covered. The column files are memory-mapped on
+load, so a rerun starts from disk instead of a network round-trip. The frames
+load_prices() returns are views of those maps and read-only; copy() one before
+modifying it in place. An update writes a new version instead of replacing
+files that may still be mapped (which Windows refuses), and older versions are
+deleted once nothing holds them open any more.
+
+load_prices() only downloads the parts of the requested [start, end) range
+that are not covered yet. import_file() fills the store from local CSV or
+Parquet files, and with offline=True (or PRICE_STORE_OFFLINE=1) nothing is
+ever downloaded, which lets the scripts run without network access.
+'''
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROOT = os.environ.get('PRICE_STORE_DIR', os.path.join(os.path.expanduser('~'), '.price_store'))
+
+
+def _offline_default():
+    return os.environ.get('PRICE_STORE_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+
+def _ticker_dir(ticker, root):
+    return os.path.join(root, ticker.upper())
+
+
+def _read_meta(path):
+    meta_file = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_file):
+        return {'columns': [], 'ranges': []}
+    with open(meta_file) as file:
+        return json.load(file)
+
+
+def _merge_ranges(ranges):
+    # Union of half-open [start, end) date ranges, as sorted ISO date strings
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(ranges, start, end):
+    # Parts of [start, end) not covered by ranges
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in _merge_ranges(ranges):
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def _normalize_frame(frame, ticker):
+    # yf.download returns (Price, Ticker) columns in newer versions
+    if isinstance(frame.columns, pd.MultiIndex):
+        frame = frame.xs(ticker, axis=1, level=-1) if ticker in frame.columns.get_level_values(-1) else frame.droplevel(-1, axis=1)
+    frame = frame.copy()
+    frame.index = pd.DatetimeIndex(frame.index)
+    if frame.index.tz is not None:
+        frame.index = frame.index.tz_localize(None)
+    frame.index.name = 'Date'
+    return frame.sort_index()
+
+
+def _column_file(path, name, version):
+    # Stores written before versioning have no version in meta.json and plain <column>.npy files
+    return os.path.join(path, f'{name}.npy' if version is None else f'{name}.{version}.npy')
+
+
+def load_arrays(ticker, root=DEFAULT_ROOT, mmap_mode='r'):
+    # Memory-mapped column arrays of everything stored for ticker
+    path = _ticker_dir(ticker, root)
+    meta = _read_meta(path)
+    if not meta['columns']:
+        return np.empty(0, dtype='datetime64[ns]'), {}
+    version = meta.get('version')
+    dates = np.load(_column_file(path, 'dates', version), mmap_mode=mmap_mode)
+    columns = {column: np.load(_column_file(path, column, version), mmap_mode=mmap_mode) for column in meta['columns']}
+    return dates, columns
+
+
+def _write(ticker, frame, ranges, root):
+    path = _ticker_dir(ticker, root)
+    os.makedirs(path, exist_ok=True)
+    previous = _read_meta(path).get('version')
+    version = 1 if previous is None else previous + 1
+
+    # New files under a new version, published by replacing meta.json last, so a crash never
+    # leaves a half-written store and no file that a reader may have mapped is overwritten
+    arrays = {'dates': frame.index.values.astype('datetime64[ns]')}
+    for column in frame.columns:
+        arrays[str(column)] = frame[column].to_numpy()
+    for name, values in arrays.items():
+        np.save(_column_file(path, name, version), values)
+
+    meta = {'version': version, 'columns': [str(column) for column in frame.columns], 'ranges': _merge_ranges(ranges)}
+    with open(os.path.join(path, 'meta.json.tmp'), 'w') as file:
+        json.dump(meta, file)
+    os.replace(os.path.join(path, 'meta.json.tmp'), os.path.join(path, 'meta.json'))
+
+    # Drop the files of older versions; one still mapped (on Windows) is left for a later write
+    current = {os.path.basename(_column_file(path, name, version)) for name in arrays}
+    for name in os.listdir(path):
+        if name.endswith('.npy') and name not in current:
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+
+def store_frame(ticker, frame, start, end, root=DEFAULT_ROOT):
+    # Merge frame into the store and mark [start, end) as covered; new rows win over stored ones
+    path = _ticker_dir(ticker, root)
+    meta = _read_meta(path)
+    dates, columns = load_arrays(ticker, root, mmap_mode=None)
+
+    stored = pd.DataFrame({column: np.asarray(values) for column, values in columns.items()},
+                          index=pd.DatetimeIndex(np.asarray(dates), name='Date'))
+    frame = _normalize_frame(frame, ticker)
+    if len(stored):
+        combined = pd.concat([stored, frame])
+        combined = combined[~combined.index.duplicated(keep='last')].sort_index()
+    else:
+        combined = frame
+
+    _write(ticker, combined, meta['ranges'] + [[start, end]], root)
+
+
+def _download(ticker, start, end):
+    import yfinance as yf
+    return yf.download(ticker, start=start, end=end, progress=False)
+
+
+def load_prices(ticker, start, end=None, root=DEFAULT_ROOT, offline=None, fetch=_download):
+    # Stored prices for ticker in [start, end), downloading only the missing date ranges
+    if offline is None:
+        offline = _offline_default()
+    start = pd.Timestamp(start).strftime('%Y-%m-%d')
+    end = pd.Timestamp(end if end is not None else pd.Timestamp.today().normalize()).strftime('%Y-%m-%d')
+
+    if not offline:
+        meta = _read_meta(_ticker_dir(ticker, root))
+        for gap_start, gap_end in missing_ranges(meta['ranges'], start, end):
+            frame = fetch(ticker, gap_start, gap_end)
+            # An empty download (failure or market holidays) is not recorded as covered
+            if len(frame):
+                store_frame(ticker, frame, gap_start, gap_end, root)
+
+    dates, columns = load_arrays(ticker, root)
+    lo, hi = np.searchsorted(dates, [np.datetime64(start, 'ns'), np.datetime64(end, 'ns')])
+    # copy=False keeps every column a view of its memory-mapped file
+    return pd.DataFrame({column: values[lo:hi] for column, values in columns.items()},
+                        index=pd.DatetimeIndex(dates[lo:hi], name='Date'), copy=False)
+
+
+def import_file(ticker, file_path, root=DEFAULT_ROOT):
+    # Load a local CSV or Parquet price file (date index + OHLCV columns) into the store
+    if file_path.endswith('.parquet'):
+        frame = pd.read_parquet(file_path)
+        if not isinstance(frame.index, pd.DatetimeIndex):
+            frame = frame.set_index(frame.columns[0])
+    else:
+        frame = pd.read_csv(file_path, index_col=0, parse_dates=True)
+
+    frame = _normalize_frame(frame, ticker)
+    start = frame.index[0].strftime('%Y-%m-%d')
+    end = (frame.index[-1] + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    store_frame(ticker, frame, start, end, root)
+    return frame
+
+
+def load_close_matrix(tickers, start, end=None, root=DEFAULT_ROOT, offline=None, column='Close', fill=True):
+    # One column per ticker aligned on the union of dates (dates x tickers). With fill, gaps inside
+    # a ticker's history are forward filled; rows before its first price stay NaN. A ticker with no
+    # prices at all (unknown, delisted, or not stored while offline) is an all-NaN column.
+    closes = {}
+    for ticker in tickers:
+        frame = load_prices(ticker, start, end, root, offline)
+        closes[ticker] = frame[column] if column in frame else pd.Series(dtype=np.float64)
+    closes = pd.DataFrame(closes).sort_index()
+    return closes.ffill() if fill else closes
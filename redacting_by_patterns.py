@@ -1,33 +1,204 @@
-import pandas as pd
+import hashlib
+import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-# Load the data file to update
-data_file = pd.read_excel('path_to_data_file.xlsx')
-
-# Define the regular expression to match words to hide
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
 
-#For app_named_to_hide - Create an xlsx file, and call colum 1A, apps, place specific words you want deleted from the file
-# Load the list of app names to hide
-app_names_file = pd.read_excel('path_to_app_names_file.xlsx')
-app_names_to_hide = set(app_names_file['apps'])
-#or if several
-#app_names_to_hide = ['app1', 'app2', 'app3']  # Replace with your list of app names
-app_names_pattern = r'\b(?:{})\b'.format('|'.join(app_names_to_hide))
+# Define the regular expressions to match words to hide
 all_cap_pattern = r'\b[A-Z]{2,3}\d?\b'
 network_path_pattern = r'\\\\[^\\\n]+\b'
 url_pattern = r'\b(?:https?://|www\.)\S+\b'
-pattern = r'{}|{}|{}|{}'.format(all_cap_pattern, network_path_pattern, url_pattern, app_names_pattern)
 
-# Create a new DataFrame to hold the updated values
-updated_data_file = pd.DataFrame()
+# '_' and '-' are turned into spaces before matching, in the same pass over each cell
+separators = str.maketrans({'_': ' ', '-': ' '})
+
+
+def load_app_names(app_names_path):
+    #For app_named_to_hide - Create an xlsx file, and call colum 1A, apps, place specific words you want deleted from the file
+    app_names_file = pd.read_excel(app_names_path)
+    return set(app_names_file['apps'].dropna().astype(str))
+
+
+def _trie_regex(node):
+    # node maps a character to its child node; '' marks the end of a name
+    alternatives = []
+    optional = '' in node
+    for char in sorted(key for key in node if key):
+        alternatives.append(re.escape(char) + _trie_regex(node[char]))
+    if not alternatives:
+        return ''
+    body = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    if optional:
+        return '(?:' + body + ')?'
+    return body
+
+
+def build_app_names_pattern(app_names):
+    # One trie-shaped regex instead of a flat alternation, so matching a position costs
+    # the length of the longest name rather than the number of names
+    trie = {}
+    for name in app_names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return r'\b(?:{})\b'.format(_trie_regex(trie)) if trie else None
+
 
-# Iterate over each column in the data file and apply the regular expression to each cell
-for column in data_file.columns:
-    if data_file[column].dtype == 'object':  # Check if column contains strings
-        updated_column = data_file[column].str.replace('_', ' ').str.replace('-', ' ').apply(lambda x: re.sub(pattern, '***', str(x)))
+def compile_redaction_pattern(app_names, cache_dir='.redaction_cache'):
+    # The trie pattern for a given name list is built once and kept on disk, keyed by the names
+    key = hashlib.sha256('\n'.join(sorted(app_names)).encode('utf-8')).hexdigest()
+    cache_file = os.path.join(cache_dir, key + '.re')
+    if os.path.exists(cache_file):
+        with open(cache_file, encoding='utf-8') as file:
+            app_names_pattern = file.read() or None
     else:
-        updated_column = data_file[column]
-    updated_data_file[column] = updated_column
+        app_names_pattern = build_app_names_pattern(app_names)
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as file:
+            file.write(app_names_pattern or '')
+
+    patterns = [all_cap_pattern, network_path_pattern, url_pattern]
+    if app_names_pattern:
+        patterns.append(app_names_pattern)
+    return re.compile('|'.join(patterns))
+
+
+def redact_value(value, pattern):
+    # Missing cells stay missing; everything else is redacted as text
+    if value is None or (isinstance(value, float) and value != value):
+        return value
+    return pattern.sub('***', str(value).translate(separators))
+
+
+def redact_frame(data_file, pattern):
+    # Only object (string) columns are redacted, as before
+    updated_data_file = data_file.copy()
+    for column in data_file.columns:
+        if data_file[column].dtype == 'object' or pd.api.types.is_string_dtype(data_file[column].dtype):
+            updated_data_file[column] = [redact_value(value, pattern) for value in data_file[column]]
+    return updated_data_file
+
+
+def read_chunks(input_path, chunk_rows=50_000):
+    # DataFrames of at most chunk_rows rows; xlsx goes through openpyxl's read-only mode
+    if input_path.lower().endswith('.csv'):
+        yield from pd.read_csv(input_path, chunksize=chunk_rows)
+        return
+
+    source = load_workbook(input_path, read_only=True)
+    rows = source.active.iter_rows(values_only=True)
+    header = next(rows, None)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_rows:
+            yield pd.DataFrame(batch, columns=header)
+            batch = []
+    if batch or header is None:
+        yield pd.DataFrame(batch, columns=header)
+    source.close()
+
+
+def write_chunks(output_path, chunks):
+    # Append each chunk as soon as it is ready; xlsx goes through openpyxl's write-only mode
+    if output_path.lower().endswith('.csv'):
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        return
+
+    target = Workbook(write_only=True)
+    sheet = target.create_sheet()
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            sheet.append(list(chunk.columns))  # Header row
+        for row in chunk.itertuples(index=False):
+            sheet.append([None if isinstance(value, float) and value != value else value for value in row])
+    target.save(output_path)
+
+
+def redact_file(input_path, output_path, pattern, chunk_rows=50_000):
+    write_chunks(output_path, (redact_frame(chunk, pattern) for chunk in read_chunks(input_path, chunk_rows)))
+
+
+# Per-process state of the parallel pipeline, set up by _init_worker()
+_worker = {}
+
+
+def _init_worker(pattern_source, cache_size):
+    pattern = re.compile(pattern_source)
+    _worker['redact'] = lru_cache(maxsize=cache_size)(lambda text: pattern.sub('***', text.translate(separators)))
+
+
+def _redact_values(values):
+    redact = _worker['redact']
+    misses = redact.cache_info().misses
+    redacted = [redact(str(value)) for value in values]
+    return redacted, redact.cache_info().misses - misses
+
+
+def redact_file_parallel(input_path, output_path, pattern, workers=None, chunk_rows=50_000, cache_size=100_000):
+    # Each object column of each chunk is reduced to its unique values, which are redacted in a
+    # process pool with a bounded per-process LRU cache, and chunks are written back in order
+    workers = workers or os.cpu_count()
+    stats = {'rows': 0, 'cells': 0, 'redactions': 0}
+    started = time.perf_counter()
+
+    def submit(executor, chunk):
+        columns = []
+        for column in chunk.columns:
+            if chunk[column].dtype == 'object' or pd.api.types.is_string_dtype(chunk[column].dtype):
+                codes, uniques = pd.factorize(chunk[column])
+                columns.append((column, codes, executor.submit(_redact_values, list(uniques))))
+        return chunk, columns
+
+    def collect(chunk, columns):
+        chunk = chunk.copy()
+        for column, codes, future in columns:
+            redacted, misses = future.result()
+            # Missing cells (code -1) keep their original value
+            values = np.array(redacted + [None], dtype=object)[codes]
+            chunk[column] = np.where(codes >= 0, values, chunk[column].to_numpy(dtype=object))
+            stats['cells'] += int((codes >= 0).sum())
+            stats['redactions'] += misses
+        stats['rows'] += len(chunk)
+        return chunk
+
+    def redacted_chunks(executor):
+        # At most two chunks per worker are in flight, so memory stays bounded
+        pending = deque()
+        for chunk in read_chunks(input_path, chunk_rows):
+            pending.append(submit(executor, chunk))
+            if len(pending) > 2 * workers:
+                yield collect(*pending.popleft())
+        while pending:
+            yield collect(*pending.popleft())
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pattern.pattern, cache_size)) as executor:
+        write_chunks(output_path, redacted_chunks(executor))
+
+    elapsed = time.perf_counter() - started
+    hit_rate = 1 - stats['redactions'] / stats['cells'] if stats['cells'] else 0.0
+    print(f"Redacted {stats['rows']} rows in {elapsed:.1f}s ({stats['rows'] / max(elapsed, 1e-9):,.0f} rows/s), "
+          f"{stats['cells']} cells, cache hit rate {hit_rate:.1%}")
+    return stats
+
+
+def main():
+    # Load the list of app names to hide
+    app_names_to_hide = load_app_names('path_to_app_names_file.xlsx')
+    #or if several
+    #app_names_to_hide = ['app1', 'app2', 'app3']  # Replace with your list of app names
+    pattern = compile_redaction_pattern(app_names_to_hide)
+
+    # Redact the data file across all cores and save the updated data to a new file
+    redact_file_parallel('path_to_data_file.xlsx', 'path_to_updated_data_file.xlsx', pattern)
 
-# Save the updated data to a new xlsx file
-updated_data_file.to_excel('path_to_updated_data_file.xlsx', index=False)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#resultstore.py
+'''
+Append-only SQLite store for grid search results.
+
+Every (short, long, performance) result is kept under a key of ticker, the
+first and last date of the price history searched, and a search label
+('buy', or 'sell 20/26' for the sell grid of buy pair 20/26). Results are
+committed chunk by chunk while a search runs, so a search that is killed
+part way keeps everything it finished. Rerunning it with the same key only
+evaluates the pairs that are still missing.
+
+    store = ResultStore()
+    store.top('SPY', '2000-01-03', '2023-03-30', 'buy', 10)
+'''
+import os
+import sqlite3
+
+import numpy as np
+
+DEFAULT_PATH = os.environ.get('RESULT_STORE_PATH', 'grid_search_results.db')
+
+_schema = '''
+create table if not exists results (
+    ticker text not null,
+    start_date text not null,
+    end_date text not null,
+    search text not null,
+    short_ma integer not null,
+    long_ma integer not null,
+    performance real,
+    primary key (ticker, start_date, end_date, search, short_ma, long_ma)
+)
+'''
+
+
+def search_key(ticker, data, search):
+    # Key for a search over the whole of data, a DataFrame indexed by date
+    return (ticker.upper(), data.index[0].date().isoformat(), data.index[-1].date().isoformat(), search)
+
+
+class ResultStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        # WAL lets top() be queried from another process while a search is writing
+        self._connection.execute('pragma journal_mode=wal')
+        self._connection.execute(_schema)
+        self._connection.commit()
+
+    def add(self, key, pairs, performance):
+        # NaN performance is stored as NULL by sqlite and read back as NaN
+        rows = [key + (int(short_ma), int(long_ma), value)
+                for (short_ma, long_ma), value in zip(pairs, np.asarray(performance).tolist())]
+        with self._connection:
+            self._connection.executemany('insert or ignore into results values (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def load(self, key):
+        # pair -> performance for everything already computed under key
+        rows = self._connection.execute(
+            'select short_ma, long_ma, performance from results '
+            'where ticker = ? and start_date = ? and end_date = ? and search = ?', key)
+        return {(short_ma, long_ma): np.nan if performance is None else performance
+                for short_ma, long_ma, performance in rows}
+
+    def top(self, ticker, start_date, end_date, search, n=10):
+        # Best n (short, long, performance) results; NULL (NaN) sorts last
+        rows = self._connection.execute(
+            'select short_ma, long_ma, performance from results '
+            'where ticker = ? and start_date = ? and end_date = ? and search = ? '
+            'order by performance desc limit ?', (ticker.upper(), start_date, end_date, search, n))
+        return [(short_ma, long_ma, np.nan if performance is None else performance) for short_ma, long_ma, performance in rows]
+
+    def close(self):
+        self._connection.close()
+
+    def cached(self, key, evaluate, n):
+        # Wraps evaluate(pairs, stop, on_chunk) into the evaluate(pairs, stop) of paramsearch.py.
+        # Full-history results come from the store when present; the rest are computed and
+        # committed as each chunk finishes. Prefix evaluations (stop < n) are not stored.
+        def wrapped(pairs, stop):
+            if stop != n:
+                return evaluate(pairs, stop, None)
+
+            done = self.load(key)
+            missing = [pair for pair in pairs if pair not in done]
+            if missing:
+                def on_chunk(chunk, performance):
+                    self.add(key, chunk, performance)
+                    done.update(zip(chunk, performance.tolist()))
+
+                evaluate(missing, stop, on_chunk)
+            return np.array([done[pair] for pair in pairs], dtype=np.float64)
+
+        return wrapped
@@ -1,4 +1,12 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote
+
 import requests
+from requests.adapters import HTTPAdapter
 
 # Specify the URL of the SharePoint 2016 site
 site_url = "https://your-site-url.com"
@@ -6,37 +14,158 @@ site_url = "https://your-site-url.com"
 # Specify the name of the SharePoint 2016 document library
 doc_library_name = "Documents"
 
-# Specify the path and name of the file to upload
-file_path = "C:\\files\\file_to_upload.docx"
+# Specify the local folder to migrate; its subfolders are recreated in the library
+source_folder = "C:\\files\\to_upload"
 
 # Specify the SharePoint 2016 username and password
 username = "your_username"
 password = "your_password"
 
-# Authenticate to the SharePoint site
-auth = requests.auth.HTTPBasicAuth(username, password)
-
-# Get the form digest value for the SharePoint site
-response = requests.post(site_url + "/_api/contextinfo", auth=auth)
-form_digest = response.json()["d"]["GetContextWebInformation"]["FormDigestValue"]
-
-# Upload the file to the SharePoint site
-with open(file_path, "rb") as file:
-    file_contents = file.read()
-    response = requests.post(
-        site_url + f"/_api/web/lists/GetByTitle('{doc_library_name}')/RootFolder/Files/Add(url='{file_path}',overwrite=true)",
-        data=file_contents,
-        headers={
-            "X-RequestDigest": form_digest,
-            "accept": "application/json;odata=verbose",
-            "content-type": "application/octet-stream"
-        },
-        auth=auth
-    )
-
-# Check the response status code for success or failure
-if response.status_code == requests.codes.ok:
-    print("File uploaded successfully")
-else:
-    print("File upload failed")
-    print(response.json())
+# Files larger than this are sent with StartUpload/ContinueUpload/FinishUpload in pieces of this size
+chunk_size = 8 * 1024 * 1024
+
+# Number of files uploaded at the same time, and attempts per request before giving up
+max_workers = 8
+max_attempts = 5
+
+json_headers = {"accept": "application/json;odata=verbose"}
+
+
+def make_session(username, password, pool_size=max_workers):
+    # One session for the whole run so connections are pooled and reused across threads
+    session = requests.Session()
+    session.auth = requests.auth.HTTPBasicAuth(username, password)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class FormDigest:
+    # Caches the contextinfo form digest and fetches a new one only shortly before it expires
+    def __init__(self, session, site_url, margin=60):
+        self.session = session
+        self.site_url = site_url
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires = 0.0
+
+    def get(self, force=False):
+        with self._lock:
+            if force or self._value is None or time.monotonic() >= self._expires:
+                response = self.session.post(self.site_url + "/_api/contextinfo", headers=json_headers)
+                response.raise_for_status()
+                info = response.json()["d"]["GetContextWebInformation"]
+                self._value = info["FormDigestValue"]
+                self._expires = time.monotonic() + info.get("FormDigestTimeoutSeconds", 1800) - self.margin
+            return self._value
+
+
+def _literal(value):
+    # Quote a value for use inside '...' in a REST URL
+    return quote(value.replace("'", "''"), safe="/")
+
+
+def post(session, digest, url, data=b"", content_type="application/octet-stream", attempts=max_attempts, backoff=0.5):
+    # POST with the cached digest, retrying throttling, server errors and dropped connections
+    # with exponential backoff. An expired digest (403) is refreshed once per attempt.
+    for attempt in range(attempts):
+        if hasattr(data, "seek"):
+            data.seek(0)
+        try:
+            response = session.post(url, data=data, headers=dict(json_headers, **{
+                "X-RequestDigest": digest.get(),
+                "content-type": content_type,
+            }))
+        except requests.ConnectionError:
+            if attempt == attempts - 1:
+                raise
+        else:
+            if response.status_code == 403 and attempt < attempts - 1:
+                digest.get(force=True)
+                continue
+            if response.status_code not in (429, 500, 502, 503, 504) or attempt == attempts - 1:
+                response.raise_for_status()
+                return response
+        time.sleep(backoff * 2 ** attempt)
+
+
+def library_root(session, site_url, doc_library_name):
+    response = session.get(site_url + f"/_api/web/lists/GetByTitle('{_literal(doc_library_name)}')/RootFolder", headers=json_headers)
+    response.raise_for_status()
+    return response.json()["d"]["ServerRelativeUrl"]
+
+
+def ensure_folder(session, digest, site_url, parent_url, name):
+    post(session, digest, site_url + f"/_api/web/GetFolderByServerRelativeUrl('{_literal(parent_url)}')/Folders/add(url='{_literal(name)}')")
+    return parent_url + "/" + name
+
+
+def upload_file(session, digest, site_url, folder_url, local_path):
+    name = os.path.basename(local_path)
+    add_url = site_url + f"/_api/web/GetFolderByServerRelativeUrl('{_literal(folder_url)}')/Files/add(url='{_literal(name)}',overwrite=true)"
+    size = os.path.getsize(local_path)
+
+    with open(local_path, "rb") as file:
+        if size <= chunk_size:
+            # Small files go up in one request, streamed from disk
+            post(session, digest, add_url, data=file)
+            return size
+
+        # Large files: create an empty file, then send it chunk by chunk so memory stays bounded
+        post(session, digest, add_url)
+        file_url = site_url + f"/_api/web/GetFileByServerRelativeUrl('{_literal(folder_url + '/' + name)}')"
+        upload_id = uuid.uuid4()
+        offset = 0
+        while True:
+            chunk = file.read(chunk_size)
+            if offset == 0:
+                action = f"StartUpload(uploadId=guid'{upload_id}')"
+            elif offset + len(chunk) >= size:
+                action = f"FinishUpload(uploadId=guid'{upload_id}',fileOffset={offset})"
+            else:
+                action = f"ContinueUpload(uploadId=guid'{upload_id}',fileOffset={offset})"
+            post(session, digest, file_url + "/" + action, data=chunk)
+            offset += len(chunk)
+            if offset >= size:
+                return size
+
+
+def upload_directory(site_url, doc_library_name, source_folder, username, password, workers=max_workers):
+    session = make_session(username, password, workers)
+    digest = FormDigest(session, site_url)
+    root_url = library_root(session, site_url, doc_library_name)
+
+    # Recreate the folder tree first (top-down), then upload every file concurrently
+    jobs = []
+    folders = {source_folder: root_url}
+    for directory, subdirectories, files in os.walk(source_folder):
+        for subdirectory in subdirectories:
+            folders[os.path.join(directory, subdirectory)] = ensure_folder(session, digest, site_url, folders[directory], subdirectory)
+        jobs.extend((folders[directory], os.path.join(directory, name)) for name in files)
+
+    started = time.perf_counter()
+    uploaded, failed, total_bytes = 0, [], 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload_file, session, digest, site_url, folder_url, local_path): local_path
+                   for folder_url, local_path in jobs}
+        for future in as_completed(futures):
+            try:
+                total_bytes += future.result()
+                uploaded += 1
+            except requests.RequestException as error:
+                failed.append((futures[future], error))
+
+    elapsed = time.perf_counter() - started
+    print(f"Uploaded {uploaded} files ({total_bytes / 1e6:.1f} MB) in {elapsed:.1f}s, {len(failed)} failed")
+    for local_path, error in failed:
+        print("File upload failed:", local_path, error)
+    return uploaded, failed
+
+
+def main():
+    upload_directory(site_url, doc_library_name, source_folder, username, password)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#streaming.py
+'''
+Incremental moving average crossover signals for live bars.
+
+StreamingCross keeps running sums for the short and long windows in a fixed
+ring buffer, so each new bar costs O(1) no matter how long the history is.
+The sums are recomputed from the buffer every time it wraps around, so
+floating-point error from adding and subtracting doesn't build up over a long
+stream (still O(1) per bar on average).
+Every update returns the same values moving_average_cross_strategy() and
+calculate_performance() would produce for that bar (short_mavg, long_mavg,
+signal, positions and the portfolio total), without building any DataFrames.
+'''
+import math
+from collections import namedtuple
+
+import numpy as np
+
+Bar = namedtuple('Bar', ['date', 'close', 'short_mavg', 'long_mavg', 'signal', 'positions', 'total'])
+
+
+class StreamingCross:
+    def __init__(self, short_window, long_window, shares=4):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.shares = shares
+
+        # Last long_window closes; the short window is the most recent short_window of them
+        self._buffer = [0.0] * max(short_window, long_window)
+        self._count = 0
+        self._short_sum = 0.0
+        self._long_sum = 0.0
+
+        self._signal = 0.0
+        self._positions = np.nan
+        self._initial_capital = None
+        self._cash = None
+        self._total = None
+
+    @classmethod
+    def from_history(cls, closes, short_window, long_window, shares=4):
+        # Warm up on past closes (e.g. data['Close']) before switching to live bars
+        stream = cls(short_window, long_window, shares)
+        stream.update_many(closes)
+        return stream
+
+    def _window_sum(self, total, window, close):
+        size = len(self._buffer)
+        if self._count >= window:
+            total -= self._buffer[(self._count - window) % size]
+        return total + close
+
+    def update(self, close, date=None):
+        close = float(close)
+        t = self._count
+
+        self._short_sum = self._window_sum(self._short_sum, self.short_window, close)
+        self._long_sum = self._window_sum(self._long_sum, self.long_window, close)
+        self._buffer[t % len(self._buffer)] = close
+        self._count += 1
+        if self._count % len(self._buffer) == 0:
+            # The buffer is full and ends with the newest close: re-sum instead of carrying the drift
+            size = len(self._buffer)
+            self._short_sum = math.fsum(self._buffer[size - self.short_window:])
+            self._long_sum = math.fsum(self._buffer[size - self.long_window:])
+
+        short_mavg = self._short_sum / min(self._count, self.short_window)
+        long_mavg = self._long_sum / min(self._count, self.long_window)
+
+        signal = 1.0 if t >= self.short_window and short_mavg > long_mavg else 0.0
+        previous_positions = self._positions
+        positions = np.nan if t == 0 else signal - self._signal
+        self._signal = signal
+        self._positions = positions
+
+        # Same cash/holdings bookkeeping as calculate_performance()
+        if t == 0:
+            self._initial_capital = self.shares * close
+            self._cash = self._initial_capital
+        elif t >= 2:
+            self._cash -= self.shares * (positions - previous_positions) * close
+        holdings = 0.0 if t == 0 else self.shares * positions * close
+        self._total = self._cash + holdings
+
+        return Bar(date, close, short_mavg, long_mavg, signal, positions, self._total)
+
+    def update_many(self, closes, dates=None):
+        # Small batches, e.g. a pandas Series of new bars; the dates default to its index
+        if dates is None:
+            dates = getattr(closes, 'index', [None] * len(closes))
+        return [self.update(close, date) for close, date in zip(closes, dates)]
+
+    @property
+    def overall_performance(self):
+        # get_performance_metrics()'s overall performance for everything seen so far
+        if self._initial_capital is None:
+            return np.nan
+        return self._total / self._initial_capital - 1
@@ -0,0 +1,144 @@
+#test_copySPsite.py
+'''
+Tests for the SharePoint site export against a local http.server stub
+standing in for the SharePoint 2013 REST API.
+'''
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+import copySPsite
+
+# Two pages of lists, 25 items per list served 10 at a time; odd ids are documents
+LISTS = ['L1', 'L2', 'L3']
+ITEMS = [{'Id': i, 'Modified': f'2023-01-{1 + i:02d}T00:00:00Z', 'FSObjType': 0 if i % 2 else 1,
+          'FileRef': f'/Docs/f{i}.txt'} for i in range(25)]
+
+
+class SiteStub(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload=None, raw=None):
+        body = raw if raw is not None else json.dumps({'d': payload}).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, rows, url, skip, size):
+        page = {'results': rows[skip:skip + size]}
+        if skip + size < len(rows):
+            page['__next'] = f'{self.server.url}{url.path}?{url.query.split("&skip=")[0]}&skip={skip + size}'
+        return page
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        path = unquote(url.path)
+        query = parse_qs(url.query)
+        skip = int(query.get('skip', ['0'])[0])
+        with server.lock:
+            server.requests.append(unquote(self.path))
+
+        if path.endswith('/$value'):
+            if any(name in path for name in server.failing):
+                return self._send(500, raw=b'')
+            return self._send(200, raw=path.encode())
+        if path.endswith('/_api/web/webs'):
+            return self._send(200, {'results': []})
+        if path.endswith('/_api/web'):
+            return self._send(200, {'__metadata': {}, 'Title': 'Site'})
+        if path.endswith('/_api/web/lists'):
+            rows = [{'__metadata': {}, 'Id': list_id, 'Title': list_id} for list_id in LISTS]
+            return self._send(200, self._page(rows, url, skip, 2))
+        if '/items' in path:
+            since = re.search(r"Modified gt datetime'(.*?)'", unquote(url.query))
+            rows = [row for row in server.items if not since or row['Modified'] > since.group(1)]
+            return self._send(200, self._page(rows, url, skip, 10))
+        self._send(404, raw=b'')
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), SiteStub)
+    httpd.lock = threading.Lock()
+    httpd.requests, httpd.failing, httpd.items = [], set(), list(ITEMS)
+    httpd.url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _export(server, folder):
+    export = copySPsite.SiteExport(server.url, 'user', 'password', str(folder), workers=4, page_size=10)
+    return export, export.run()
+
+
+def _lines(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_pages_of_lists_and_items_are_followed(server, tmp_path):
+    export, stats = _export(server, tmp_path)
+
+    assert export.failures == []
+    assert stats == {'webs': 1, 'lists': 3, 'items': 75, 'files': 36}
+    assert [row['Id'] for row in _lines(tmp_path / 'lists.jsonl')] == LISTS
+    for list_id in LISTS:
+        assert sorted(row['Id'] for row in _lines(tmp_path / 'items' / f'{list_id}.jsonl')) == list(range(25))
+        assert not os.path.exists(tmp_path / 'items' / f'{list_id}.part.jsonl')
+    assert (tmp_path / 'files' / 'Docs' / 'f1.txt').read_bytes().endswith(b"('/Docs/f1.txt')/$value")
+    with open(tmp_path / 'state.json') as file:
+        assert json.load(file) == {list_id: '2023-01-25T00:00:00Z' for list_id in LISTS}
+
+
+def test_failed_download_holds_back_the_checkpoint_until_a_rerun(server, tmp_path):
+    server.failing = {'f5.txt'}
+    export, _ = _export(server, tmp_path)
+
+    assert len(export.failures) == 3  # f5.txt is a document of every list
+    assert not os.path.exists(tmp_path / 'state.json')
+    for list_id in LISTS:
+        assert not os.path.exists(tmp_path / 'items' / f'{list_id}.jsonl')
+
+    server.failing = set()
+    export, stats = _export(server, tmp_path)
+    assert export.failures == []
+    assert stats['files'] == 36
+    assert (tmp_path / 'files' / 'Docs' / 'f5.txt').exists()
+    for list_id in LISTS:
+        assert len(_lines(tmp_path / 'items' / f'{list_id}.jsonl')) == 25
+    with open(tmp_path / 'state.json') as file:
+        assert json.load(file) == {list_id: '2023-01-25T00:00:00Z' for list_id in LISTS}
+
+
+def test_rerun_only_asks_for_items_modified_since_the_checkpoint(server, tmp_path):
+    _export(server, tmp_path)
+    server.requests.clear()
+
+    export, stats = _export(server, tmp_path)
+    assert export.failures == []
+    item_requests = [request for request in server.requests if '/items' in request]
+    assert len(item_requests) == 3
+    assert all("$filter=Modified gt datetime'2023-01-25T00:00:00Z'" in request for request in item_requests)
+    assert not any(request.endswith('/$value') for request in server.requests)
+    assert (stats['items'], stats['files']) == (0, 0)
+    for list_id in LISTS:
+        assert len(_lines(tmp_path / 'items' / f'{list_id}.jsonl')) == 25
+
+    # A new document is picked up and appended on the next run
+    server.items.append({'Id': 99, 'Modified': '2023-02-01T00:00:00Z', 'FSObjType': 0, 'FileRef': '/Docs/new.txt'})
+    export, stats = _export(server, tmp_path)
+    assert (stats['items'], stats['files']) == (3, 3)
+    assert len(_lines(tmp_path / 'items' / 'L1.jsonl')) == 26
+    with open(tmp_path / 'state.json') as file:
+        assert json.load(file)['L1'] == '2023-02-01T00:00:00Z'
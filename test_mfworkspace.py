@@ -0,0 +1,161 @@
+#test_mfworkspace.py
+'''
+Tests for the mainframe session pool against a fake emulator that plays a
+tiny host: log-on screens, account screens and a ready screen.
+'''
+import itertools
+import threading
+import types
+
+import pytest
+
+pytest.importorskip("py3270")
+
+import mfworkspace
+
+
+class FakeEmulator:
+    # Accounts starting with 'A' open an account screen; 'BAD' shows a one-line error screen
+    # (too short to parse), 'SLOW' never shows the expected text. PF(3) returns to READY.
+    ids = itertools.count()
+    fail_logins = set()
+
+    def __init__(self, visible=False):
+        self.id = next(self.ids)
+        self.screen = [''] * 24
+        self.commands = []
+        self.terminated = False
+        self.polls = 0
+
+    def connect(self, address):
+        if self.id in self.fail_logins:
+            raise ConnectionError("host down")
+        self.screen = ['LOGON'] + [''] * 23
+
+    def wait_for_field(self):
+        pass
+
+    def send_string(self, text):
+        self.commands.append(text)
+        self.pending = text
+
+    def send_enter(self):
+        text = self.pending
+        if text == 'username':
+            # The password prompt only shows up after a few polls
+            self.screen = ['LOGON'] + [''] * 23
+            self.polls = 3
+        elif text == 'password':
+            self.screen = ['READY'] + [''] * 23
+        elif text == 'BAD':
+            self.screen = ['ACCOUNT NOT FOUND']
+        elif text == 'SLOW':
+            self.screen = ['PLEASE WAIT'] + [''] * 23
+        else:
+            self.screen = [''] * 24
+            self.screen[2] = ' ' * 19 + text.ljust(10)
+            self.screen[3] = ' ' * 19 + 'NAME ' + text
+
+    def exec_command(self, command):
+        self.commands.append(command)
+        if command == b'PF(3)':
+            self.screen = ['READY'] + [''] * 23
+        elif command == b'Ascii()' and self.polls:
+            self.polls -= 1
+            if not self.polls:
+                self.screen = ['PASSWORD'] + [''] * 23
+        return types.SimpleNamespace(data=[line.encode() for line in self.screen])
+
+    def terminate(self):
+        self.terminated = True
+
+
+@pytest.fixture
+def emulators(monkeypatch):
+    monkeypatch.setattr(mfworkspace, 'screen_timeout', 0.2)
+    FakeEmulator.fail_logins = set()
+    made = []
+    lock = threading.Lock()
+
+    def factory(visible=False):
+        emulator = FakeEmulator(visible)
+        with lock:
+            made.append(emulator)
+        return emulator
+
+    factory.made = made
+    return factory
+
+
+def _pooled(pool):
+    return list(pool._sessions.queue)
+
+
+def test_login_waits_for_the_password_prompt(emulators):
+    emulator = mfworkspace.login(emulators)
+    typed = [command for command in emulator.commands if isinstance(command, str)]
+    assert typed == ['username', 'password']
+    # The password was only sent after polling the screen until the prompt appeared
+    assert emulator.commands.count(b'Ascii()') >= 3
+    assert emulator.screen[0] == 'READY'
+
+
+def test_wait_for_text_times_out(emulators):
+    emulator = emulators()
+    emulator.screen = ['SOMETHING ELSE']
+    with pytest.raises(TimeoutError):
+        mfworkspace.wait_for_text(emulator, 'READY', timeout=0.05, interval=0.01)
+
+
+def test_lookup_recycles_the_session_on_the_ready_screen(emulators):
+    pool = mfworkspace.SessionPool(1, emulator_factory=emulators)
+    first = pool.lookup('A1')
+    second = pool.lookup('A2')
+
+    assert first == {'account': 'A1', 'name': 'NAME A1', 'balance': ''}
+    assert second['account'] == 'A2'
+    assert len(emulators.made) == 1
+    [emulator] = _pooled(pool)
+    assert emulator.screen[0] == 'READY'
+    assert emulator.commands.count(b'PF(3)') == 2
+
+
+@pytest.mark.parametrize("command, expected_text, error", [('BAD', None, IndexError), ('SLOW', 'BALANCE', TimeoutError)])
+def test_failed_lookup_replaces_the_session(emulators, command, expected_text, error):
+    pool = mfworkspace.SessionPool(2, emulator_factory=emulators)
+    with pytest.raises(error):
+        pool.lookup(command, expected_text=expected_text)
+
+    failed = [emulator for emulator in emulators.made if command in emulator.commands]
+    assert len(failed) == 1 and failed[0].terminated
+    assert failed[0] not in _pooled(pool)
+    assert len(_pooled(pool)) == 2
+    assert all(emulator.screen[0] == 'READY' for emulator in _pooled(pool))
+
+
+def test_lookup_many_keeps_results_around_failures(emulators):
+    pool = mfworkspace.SessionPool(2, emulator_factory=emulators)
+    results = pool.lookup_many(['A1', 'BAD', 'A3', 'A4'])
+
+    assert [result and result['account'] for result in results] == ['A1', None, 'A3', 'A4']
+    assert [(command, type(error)) for command, error in pool.failures] == [('BAD', IndexError)]
+    assert len(_pooled(pool)) == 2
+
+
+def test_pool_raises_once_no_session_can_be_replaced(emulators):
+    pool = mfworkspace.SessionPool(1, emulator_factory=emulators)
+    FakeEmulator.fail_logins = {emulators.made[-1].id + 1}
+    with pytest.raises(IndexError):
+        pool.lookup('BAD')
+    with pytest.raises(RuntimeError):
+        pool.lookup('A1')
+
+
+def test_failed_pool_start_terminates_logged_in_sessions(emulators):
+    FakeEmulator.fail_logins = {next(FakeEmulator.ids) + 2}
+    with pytest.raises(ConnectionError):
+        mfworkspace.SessionPool(3, emulator_factory=emulators)
+
+    logged_in = [emulator for emulator in emulators.made if emulator.id not in FakeEmulator.fail_logins]
+    assert len(logged_in) == 2
+    assert all(emulator.terminated for emulator in logged_in)
@@ -0,0 +1,150 @@
+#test_shp2013to2016.py
+'''
+Tests for the SharePoint uploader against a local http.server stub standing
+in for the SharePoint REST API.
+'''
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import pytest
+
+import shp2013to2016
+
+
+class SharePointStub(BaseHTTPRequestHandler):
+    # Records every request; server.failures maps a substring of the path to a list of status
+    # codes returned, one per matching request, before that request succeeds
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload=None):
+        body = json.dumps(payload or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send(200, {"d": {"ServerRelativeUrl": "/sites/x/Documents"}})
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = unquote(self.path)
+        with server.lock:
+            server.requests.append((path, self.headers.get("X-RequestDigest"), body))
+            if path.endswith("/_api/contextinfo"):
+                server.digests += 1
+                return self._send(200, {"d": {"GetContextWebInformation": {
+                    "FormDigestValue": f"digest-{server.digests}", "FormDigestTimeoutSeconds": 1800}}})
+            for pattern, statuses in server.failures.items():
+                if pattern in path and statuses:
+                    return self._send(statuses.pop(0))
+
+            match = re.search(r"GetFolderByServerRelativeUrl\('(.*)'\)/Files/add\(url='(.*)',overwrite=true\)", path)
+            if match:
+                server.files[match.group(1) + "/" + match.group(2)] = body
+                return self._send(200)
+            match = re.search(r"GetFileByServerRelativeUrl\('(.*)'\)/(\w+)Upload\(.*?(?:fileOffset=(\d+))?\)$", path)
+            if match:
+                server.chunks.append((match.group(2), int(match.group(3) or 0), len(body)))
+                server.files[match.group(1)] += body
+                return self._send(200)
+            self._send(200)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(shp2013to2016.time, "sleep", lambda seconds: None)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), SharePointStub)
+    httpd.lock = threading.Lock()
+    httpd.requests, httpd.files, httpd.chunks, httpd.failures, httpd.digests = [], {}, [], {}, 0
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _upload(server, path):
+    session = shp2013to2016.make_session("user", "password")
+    digest = shp2013to2016.FormDigest(session, server.url)
+    return shp2013to2016.upload_file(session, digest, server.url, "/sites/x/Documents", str(path))
+
+
+def test_small_file_is_one_files_add(server, tmp_path):
+    path = tmp_path / "small.txt"
+    path.write_bytes(b"hello")
+
+    assert _upload(server, path) == 5
+    assert server.files == {"/sites/x/Documents/small.txt": b"hello"}
+    assert [p for p, _, _ in server.requests if "/Files/add" in p] == \
+        ["/_api/web/GetFolderByServerRelativeUrl('/sites/x/Documents')/Files/add(url='small.txt',overwrite=true)"]
+    assert server.chunks == []
+
+
+def test_large_file_is_sent_in_chunks(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(shp2013to2016, "chunk_size", 1000)
+    data = bytes(range(256)) * 10
+    path = tmp_path / "large.bin"
+    path.write_bytes(data)
+
+    assert _upload(server, path) == len(data)
+    assert server.files["/sites/x/Documents/large.bin"] == data
+    assert server.chunks == [("Start", 0, 1000), ("Continue", 1000, 1000), ("Finish", 2000, 560)]
+    upload_ids = {re.search(r"uploadId=guid'([^']+)'", p).group(1) for p, _, _ in server.requests if "Upload(" in p}
+    assert len(upload_ids) == 1
+
+
+def test_digest_is_reused_and_refreshed_after_403(server, tmp_path):
+    session = shp2013to2016.make_session("user", "password")
+    digest = shp2013to2016.FormDigest(session, server.url)
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_bytes(name.encode())
+        shp2013to2016.upload_file(session, digest, server.url, "/sites/x/Documents", str(tmp_path / name))
+    assert server.digests == 1
+    assert {sent for p, sent, _ in server.requests if "/Files/add" in p} == {"digest-1"}
+
+    server.failures["d.txt"] = [403]
+    (tmp_path / "d.txt").write_bytes(b"d")
+    shp2013to2016.upload_file(session, digest, server.url, "/sites/x/Documents", str(tmp_path / "d.txt"))
+    assert server.digests == 2
+    assert [sent for p, sent, _ in server.requests if "d.txt" in p] == ["digest-1", "digest-2"]
+    assert server.files["/sites/x/Documents/d.txt"] == b"d"
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttling_and_server_errors_are_retried(server, tmp_path, status):
+    server.failures["retry.txt"] = [status, status]
+    path = tmp_path / "retry.txt"
+    path.write_bytes(b"retried body")
+
+    _upload(server, path)
+    assert sum("retry.txt" in p for p, _, _ in server.requests) == 3
+    # The file is re-read from the start on every attempt
+    assert server.files["/sites/x/Documents/retry.txt"] == b"retried body"
+
+
+def test_retries_give_up_after_max_attempts(server, tmp_path):
+    server.failures["never.txt"] = [503] * shp2013to2016.max_attempts
+    path = tmp_path / "never.txt"
+    path.write_bytes(b"x")
+
+    with pytest.raises(shp2013to2016.requests.HTTPError):
+        _upload(server, path)
+    assert sum("never.txt" in p for p, _, _ in server.requests) == shp2013to2016.max_attempts
+
+
+def test_upload_directory_recreates_folders(server, tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "top.txt").write_bytes(b"top")
+    (tmp_path / "sub" / "inner.txt").write_bytes(b"inner")
+
+    uploaded, failed = shp2013to2016.upload_directory(server.url, "Documents", str(tmp_path), "user", "password", workers=2)
+    assert (uploaded, failed) == (2, [])
+    assert any("Folders/add(url='sub')" in p for p, _, _ in server.requests)
+    assert server.files == {"/sites/x/Documents/top.txt": b"top", "/sites/x/Documents/sub/inner.txt": b"inner"}
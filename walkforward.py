@@ -16,10 +16,19 @@ the optimization process's complexity.
 
 '''
 import pandas as pd
-import yfinance as yf
 import numpy as np
 import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from multiprocessing import shared_memory
+
+import indicators
+import instrumentation
+import macross
+import pricestore
+import wfschedule
+from streaming import StreamingCross
 
 # Import all required functions from previous replies or your existing code
 # ...
@@ -37,83 +46,128 @@ def moving_average_cross_strategy(data, short_window, long_window):
 
     return signals
 
-def calculate_performance(data, signals, shares):
-    initial_capital = float(shares * data['Close'].iloc[0])
-    positions = pd.DataFrame(index=signals.index).fillna(0.0)
-    positions['SPY'] = shares * signals['positions']
-
-    portfolio = positions.multiply(data['Close'], axis=0)
-    pos_diff = positions.diff()
-    portfolio['holdings'] = (positions.multiply(data['Close'], axis=0)).sum(axis=1)
-    portfolio['cash'] = initial_capital - (pos_diff.multiply(data['Close'], axis=0)).sum(axis=1).cumsum()
-    portfolio['total'] = portfolio['cash'] + portfolio['holdings']
-    portfolio['returns'] = portfolio['total'].pct_change()
-
-    return portfolio
+def calculate_performance(data, signals, shares, ticker="SPY"):
+    # Shared array kernel in macross.py; only the returned DataFrame is allocated per call
+    return macross.portfolio_arrays(data['Close'].to_numpy(), signals['positions'].to_numpy(), shares,
+                                    as_frame=True, index=signals.index, ticker=ticker)
 
 def get_performance_metrics(portfolio, long_ma):
-    total_trades = len(portfolio[portfolio['returns'].notnull()])
-    positive_trades = len(portfolio[portfolio['returns'] > 0])
-    negative_trades = len(portfolio[portfolio['returns'] < 0])
-    average_positive_return = portfolio[portfolio['returns'] > 0]['returns'].mean()
-    average_negative_return = portfolio[portfolio['returns'] < 0]['returns'].mean()
-    total_profit = portfolio[portfolio['returns'] > 0]['returns'].sum()
-    total_loss = portfolio[portfolio['returns'] < 0]['returns'].sum()
-    overall_performance = portfolio['total'].iloc[-1] / portfolio['total'].iloc[0] - 1
+    # All metrics come from one reduction over the returns array; see macross.performance_metrics
+    metrics = macross.performance_metrics(portfolio['returns'].to_numpy(), portfolio['total'].to_numpy())
 
-    return (long_ma, overall_performance, total_trades, positive_trades, negative_trades, average_positive_return, average_negative_return, total_profit, total_loss)
+    return (long_ma,) + metrics
 
 
 
 def grid_search(data, short_ma_values, long_ma_values):
-    best_performance = -np.inf
-    best_pair = None
-    results = []
-
-    for short_ma in short_ma_values:
-        for long_ma in long_ma_values:
-            if long_ma > short_ma:
-                signals = moving_average_cross_strategy(data, short_ma, long_ma)
-                #signals = apply_sell_conditions(data, signals)
-                portfolio = calculate_performance(data, signals, 4)
-                performance_metrics = get_performance_metrics(portfolio, long_ma)
-
-                current_performance = performance_metrics[1]  # Overall Performance (index 1)
-
-                results.append((short_ma, long_ma, current_performance))
-
-                if current_performance > best_performance:
-                    best_performance = current_performance
-                    best_pair = (short_ma, long_ma)
-
-    return best_pair, results
-
-
-def walk_forward_optimization(data, short_ma_values, long_ma_values, num_windows):
-    # Split data into windows
-    window_size = len(data) // num_windows
-    windows = [(data.iloc[i * window_size:(i + 1) * window_size]) for i in range(num_windows)]
-
-    out_of_sample_results = []
-
-    for i in range(num_windows - 1):
-        in_sample_data = windows[i]
-        out_of_sample_data = windows[i + 1]
-
-        # Find best moving average cross in the in-sample period
-        best_buy_pair, _ = grid_search(in_sample_data, short_ma_values, long_ma_values)
-
-        # Apply the best moving average cross to the out-of-sample period
-        signals = moving_average_cross_strategy(out_of_sample_data, best_buy_pair[0], best_buy_pair[1])
-        portfolio = calculate_performance(out_of_sample_data, signals, 4)
-        performance_metrics = get_performance_metrics(portfolio, best_buy_pair[1])
-
-        out_of_sample_results.append((best_buy_pair, performance_metrics))
-
-    # Calculate average performance across all out-of-sample periods
-    avg_performance = np.mean([result[1][1] for result in out_of_sample_results])
-
-    return avg_performance, out_of_sample_results
+    # Every pair is evaluated at once by the batched engine in macross.py
+    return macross.grid_search(data['Close'].to_numpy(), short_ma_values, long_ma_values, 4)
+
+
+# Per-process view of the shared closing prices, set up by _attach_prices()
+_shared_prices = {}
+
+
+def _attach_prices(name, length, key, warm_up):
+    # Workers only report back results; importing instrumentation re-reads BACKTEST_INSTRUMENT
+    # in a spawned worker, and a forked one inherits the parent's state, so switch it off here
+    instrumentation.disable()
+    shm = shared_memory.SharedMemory(name=name)
+    _shared_prices['shm'] = shm
+    _shared_prices['close'] = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)
+    _shared_prices['key'] = key
+    _shared_prices['warm_up'] = warm_up
+
+
+def _cached_means(close, cache, key, warm_up):
+    # means(start, stop, windows) for macross.evaluate_windows, served by an indicators.IndicatorCache
+    def means(start, stop, windows):
+        return cache.means(close, windows, start, stop, warm_up, key)
+
+    return means
+
+
+def _evaluate_pairs_chunk(bounds, pairs):
+    # Each worker keeps its own indicators.default_cache over the shared prices
+    close = _shared_prices['close']
+    means = _cached_means(close, indicators.default_cache, _shared_prices['key'], _shared_prices['warm_up'])
+    return macross.evaluate_windows(close, pairs, bounds, 4, means)
+
+
+def parallel_in_sample_search(data, short_ma_values, long_ma_values, bounds, workers, warm_up=False):
+    # Runs grid_search() over every (start, stop) window in a process pool. The closing prices
+    # are copied into shared memory once; each task evaluates one chunk of pairs on every window.
+    pairs = macross.valid_pairs(short_ma_values, long_ma_values)
+    chunk_size = max(1, -(-len(pairs) // workers))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+
+    close = data['Close'].to_numpy(dtype=np.float64)
+    shm = shared_memory.SharedMemory(create=True, size=max(close.nbytes, 1))
+    try:
+        np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)[:] = close
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_prices,
+                                 initargs=(shm.name, len(close), indicators.series_key(close), warm_up)) as executor:
+            futures = [executor.submit(_evaluate_pairs_chunk, bounds, chunk) for chunk in chunks]
+            progress = instrumentation.progress('pair chunks', len(chunks))
+            for future in futures:
+                future.result()
+                progress.update()
+            # Chunks are reassembled in submission order, so ties resolve exactly as in the serial path
+            performance = np.concatenate([future.result() for future in futures], axis=1)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return [macross.collect_results(pairs, row, macross.WINDOW_TIE_TOLERANCE) for row in performance]
+
+
+def walk_forward_optimization(data, short_ma_values, long_ma_values, num_windows=None, workers=None, instrument=None,
+                              cache=None, warm_up=False, schedule=None):
+    # instrument=True/False switches stage timers and progress on or off for this call (None follows
+    # BACKTEST_INSTRUMENT); see instrumentation.py.
+    # Moving averages come from an indicators.IndicatorCache (the shared default one unless cache is given),
+    # so each window length is computed once over the full history. warm_up=True carries the history
+    # before each window into its means instead of restarting them at the window edge.
+    # schedule is a list of wfschedule.Window (see wfschedule.walk_forward_schedule); without one the
+    # data is split into num_windows equal windows, each the in-sample period of the next.
+    with instrumentation.switched(instrument):
+        cache = cache or indicators.default_cache
+        if schedule is None:
+            schedule = wfschedule.equal_windows(len(data), num_windows)
+
+        close = data['Close'].to_numpy(dtype=np.float64)
+        key = indicators.series_key(close)
+        bounds = [(window.in_start, window.in_stop) for window in schedule]
+
+        # Every in-sample window is searched in one pass over the full history (see macross.evaluate_windows);
+        # with workers > 1 the pairs are split across parallel processes
+        if workers is not None and workers > 1 and bounds:
+            in_sample_searches = parallel_in_sample_search(data, short_ma_values, long_ma_values, bounds, workers, warm_up)
+        else:
+            pairs = macross.valid_pairs(short_ma_values, long_ma_values)
+            performance = macross.evaluate_windows(close, pairs, bounds, 4, _cached_means(close, cache, key, warm_up))
+            in_sample_searches = [macross.collect_results(pairs, row, macross.WINDOW_TIE_TOLERANCE) for row in performance]
+
+        out_of_sample_results = []
+        progress = instrumentation.progress('windows', len(schedule))
+
+        for window, (best_buy_pair, _) in zip(schedule, in_sample_searches):
+            start, stop = window.out_start, window.out_stop
+
+            # Apply the best moving average cross to the out-of-sample period
+            mavg, columns = cache.means(close, best_buy_pair, start, stop, warm_up, key)
+            positions = macross.position_matrix(macross.signal_matrix(mavg, columns, [best_buy_pair]))[:, 0]
+            portfolio = macross.portfolio_arrays(close[start:stop], positions, 4, as_frame=True, index=data.index[start:stop])
+            performance_metrics = get_performance_metrics(portfolio, best_buy_pair[1])
+
+            out_of_sample_results.append((best_buy_pair, performance_metrics))
+            progress.update()
+
+        # Calculate average performance across all out-of-sample periods
+        avg_performance = np.mean([result[1][1] for result in out_of_sample_results])
+
+        return avg_performance, out_of_sample_results
 
 
 def main():
@@ -123,24 +177,30 @@ def main():
     prediction_start_date = "2023-03-01"
     prediction_end_date = "2023-06-01"
 
-    data = yf.download(ticker, start=start_date, end=end_date)
+    # Served from the local price store; only missing date ranges are downloaded
+    data = pricestore.load_prices(ticker, start_date, end_date)
 
     short_ma_values = range(3, 21)  # Define a range of short MA values for buying
     long_ma_values = range(22, 51)  # Define a range of long MA values for buying
     num_windows = 8  # Define the number of windows to use for walk-forward optimization
+    workers = os.cpu_count()  # Number of processes for the in-sample grid searches (1 runs serially)
+    # Equal windows by default; e.g. monthly re-optimization on a rolling 5 year window instead:
+    # schedule = wfschedule.walk_forward_schedule(data.index, pd.DateOffset(years=5), pd.DateOffset(months=1))
+    schedule = None
 
-    avg_performance, out_of_sample_results = walk_forward_optimization(data, short_ma_values, long_ma_values, num_windows)
+    avg_performance, out_of_sample_results = walk_forward_optimization(data, short_ma_values, long_ma_values, num_windows, workers=workers, schedule=schedule)
 
     print("Average performance across all out-of-sample periods:", avg_performance)
 
     # Fetch the data for the desired prediction time frame
-    prediction_data = yf.download(ticker, start=prediction_start_date, end=prediction_end_date)
+    prediction_data = pricestore.load_prices(ticker, prediction_start_date, prediction_end_date)
 
     # Get the most recent best-performing MA crossover pair
     most_recent_best_buy_pair, _ = out_of_sample_results[-1]
 
-    # Apply the most recent best-performing MA crossover pair to the new data
-    signals = moving_average_cross_strategy(prediction_data, most_recent_best_buy_pair[0], most_recent_best_buy_pair[1])
+    # Feed the new bars through a streaming signal one at a time, as a live feed would
+    stream = StreamingCross(most_recent_best_buy_pair[0], most_recent_best_buy_pair[1], 4)
+    signals = pd.DataFrame(stream.update_many(prediction_data['Close'])).set_index('date')
 
     # Print buy signals
     buy_signals = signals.loc[signals['signal'] == 1]
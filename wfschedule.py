@@ -0,0 +1,72 @@
+#wfschedule.py
+'''
+Walk-forward window schedules.
+
+Every schedule is a list of Window(in_start, in_stop, out_start, out_stop) bar
+positions into the price history, in-sample [in_start, in_stop) followed by
+out-of-sample [out_start, out_stop), ready for walk_forward_optimization().
+
+    rolling     the in-sample window has a fixed length and moves forward by
+                step each time
+    anchored    the in-sample window always starts at the first bar and grows
+                by step each time (expanding window)
+
+Lengths and steps are either a number of bars or a date offset such as '30D'
+or pd.DateOffset(months=1); date offsets need a DatetimeIndex. step defaults
+to out_of_sample, which gives back-to-back out-of-sample windows; a shorter
+step makes them overlap. The last out-of-sample window is cut at the end of
+the data instead of being dropped.
+
+    walk_forward_schedule(data.index, pd.DateOffset(years=5), pd.DateOffset(months=1))
+'''
+import numbers
+from collections import namedtuple
+
+import pandas as pd
+
+Window = namedtuple('Window', ['in_start', 'in_stop', 'out_start', 'out_stop'])
+
+MODES = ('rolling', 'anchored')
+
+
+def _offset(length):
+    if isinstance(length, str):
+        return pd.tseries.frequencies.to_offset(length)
+    return length
+
+
+def _shift(index, position, length, k=1):
+    # Bar position k * length after position (before it for negative k), clipped to the data
+    if isinstance(length, numbers.Integral):
+        return min(max(position + k * length, 0), len(index))
+    return int(index.searchsorted(index[position] + k * _offset(length)))
+
+
+def walk_forward_schedule(index, in_sample, out_of_sample, step=None, mode='rolling'):
+    if mode not in MODES:
+        raise ValueError(f"Unknown walk-forward mode {mode!r}, expected one of {MODES}")
+    step = out_of_sample if step is None else step
+
+    windows = []
+    first_split = _shift(index, 0, in_sample)
+    split = first_split
+    k = 0
+    while split < len(index):
+        in_start = 0 if mode == 'anchored' else _shift(index, split, in_sample, -1)
+        windows.append(Window(in_start, split, split, _shift(index, split, out_of_sample)))
+
+        # Steps are taken from the first split, so date steps don't drift with month lengths
+        k += 1
+        next_split = _shift(index, first_split, step, k)
+        if next_split <= split:
+            raise ValueError("step must move the split forward by at least one bar")
+        split = next_split
+
+    return windows
+
+
+def equal_windows(n, num_windows):
+    # The original len(data) // num_windows split: each window is the in-sample of the next
+    window_size = n // num_windows
+    return [Window(i * window_size, (i + 1) * window_size, (i + 1) * window_size, (i + 2) * window_size)
+            for i in range(num_windows - 1)]